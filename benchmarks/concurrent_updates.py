@@ -0,0 +1,85 @@
+# benchmarks/concurrent_updates.py
+"""
+Пропускная способность обработки апдейтов при разном CONCURRENT_UPDATES.
+
+Каждый пользователь проходит диалог «➕ Добавить задачу» → «На сегодня» → текст → «📋 Мои задачи»;
+апдейты разных пользователей перемешаны. Bot API отвечает с задержкой --latency,
+как настоящий Telegram по сети. Для каждого уровня проверяем, что шаги одного
+пользователя не перепутались: иначе диалог не дойдёт до конца и задача не появится.
+
+    python benchmarks/concurrent_updates.py [--users 200] [--latency 0.03] [--levels 1,4,16,64]
+
+Вывод — по строке JSON на уровень.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI, text_update
+
+SCRIPT = ["➕ Добавить задачу", "На сегодня", None, "📋 Мои задачи"]
+
+def user_script(user_id):
+    return [step or f"задача {user_id}" for step in SCRIPT]
+
+async def run_level(bot, api, run, level, users):
+    # у каждого прогона свои пользователи: задачи прошлых прогонов остаются в хранилище
+    base_user = (run + 1) * 1_000_000
+    user_ids = [base_user + i for i in range(users)]
+    app = bot.build_application(webhook=True, base_url=f"{api.url}/bot", concurrent_updates=level)
+    expected = api.count("sendMessage") + users * len(SCRIPT)
+    async with app:
+        await app.start()
+        started = time.monotonic()
+        # шаги по кругу: первый шаг всех пользователей, затем второй и т.д.
+        for step in range(len(SCRIPT)):
+            for user_id in user_ids:
+                update = dict(text_update(user_id, user_script(user_id)[step]), update_id=0)
+                await app.update_queue.put(bot.Update.de_json(update, app.bot))
+        await api.wait_for(lambda: api.count("sendMessage") >= expected)
+        elapsed = time.monotonic() - started
+        await app.stop()
+    ordered = all(
+        [t["text"] for t in bot.storage.user_records("tasks", str(u))] == [f"задача {u}"]
+        and api.texts(u)[-1].startswith("📋 Задачи на сегодня:\n1. задача")
+        for u in user_ids
+    )
+    updates = users * len(SCRIPT)
+    return {
+        "concurrent_updates": level,
+        "users": users,
+        "updates": updates,
+        "latency_s": api.latency,
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1),
+        "per_user_order_ok": ordered,
+    }
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    # данные бота (JSON-файлы, история) — во временной папке, не в рабочей копии
+    os.chdir(tempfile.mkdtemp(prefix="bench_concurrency_"))
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")
+    import bot
+    try:
+        for run, level in enumerate(args.levels):
+            print(json.dumps(await run_level(bot, api, run, level, args.users), ensure_ascii=False), flush=True)
+    finally:
+        await bot.flush_on_shutdown(None)
+        await api.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.03, help="задержка ответа Bot API, с")
+    parser.add_argument("--levels", type=lambda v: [int(x) for x in v.split(",")], default=[1, 4, 16, 64])
+    asyncio.run(main(parser.parse_args()))
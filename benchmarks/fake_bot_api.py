@@ -0,0 +1,199 @@
+# benchmarks/fake_bot_api.py
+import json
+import time
+import asyncio
+from collections import Counter
+import aiohttp
+from aiohttp import web
+
+# ------------------- ЛОКАЛЬНЫЙ BOT API -------------------
+# Отвечает на методы, которые вызывает bot.py, с настраиваемой задержкой,
+# и запоминает, что и кому бот отправил. Бот подключается через
+# ApplicationBuilder().base_url(f"{url}/bot") или BOT_API_URL.
+# Апдейты отдаются через getUpdates, а после setWebhook — POST-ом на вебхук, по одному.
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+def text_update(user_id, text):
+    return {
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "text": text,
+        }
+    }
+
+def callback_update(user_id, data, message_text=""):
+    return {
+        "callback_query": {
+            "id": f"{user_id}-{time.monotonic_ns()}",
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": message_text,
+            },
+        }
+    }
+
+class FakeBotAPI:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.sent = {}
+        self.markups = {}
+        self.message_id = 0
+        self.updates = []
+        self.update_id = 0
+        self.new_update = asyncio.Event()
+        self.webhook = None
+        self.delivery = None
+        self.runner = None
+        self.url = None
+
+    # ------------------- АПДЕЙТЫ ДЛЯ getUpdates -------------------
+    def push_update(self, update):
+        self.update_id += 1
+        self.updates.append(dict(update, update_id=self.update_id))
+        self.new_update.set()
+        return self.update_id
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), 1.0)
+        # подтверждённые апдейты (id < offset) больше не храним
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(self.new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:int(params.get("limit") or 100)]
+
+    # ------------------- ДОСТАВКА НА ВЕБХУК -------------------
+    async def _deliver(self):
+        async with aiohttp.ClientSession() as session:
+            while self.webhook is not None:
+                if not self.updates:
+                    self.new_update.clear()
+                    await self.new_update.wait()
+                    continue
+                url, secret = self.webhook
+                try:
+                    async with session.post(
+                        url, json=self.updates[0], headers={"X-Telegram-Bot-Api-Secret-Token": secret}
+                    ) as response:
+                        delivered = response.status == 200
+                except aiohttp.ClientError:
+                    delivered = False
+                if delivered:
+                    self.updates.pop(0)
+                else:
+                    # как Telegram: повторяем тот же апдейт, пока вебхук не ответит 200
+                    await asyncio.sleep(0.1)
+
+    def _set_webhook(self, params):
+        url = params.get("url") or ""
+        self.webhook = (url, params.get("secret_token") or "") if url else None
+        if self.delivery is not None:
+            self.delivery.cancel()
+            self.delivery = None
+        if self.webhook is not None:
+            self.delivery = asyncio.create_task(self._deliver())
+
+    # ------------------- МЕТОДЫ -------------------
+    def _message(self, chat_id, **fields):
+        self.message_id += 1
+        message = {"message_id": self.message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        message.update(fields)
+        return message
+
+    def _record(self, chat_id, kind, payload):
+        self.sent.setdefault(chat_id, []).append((kind, payload))
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+
+        result = True
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "setWebhook":
+            self._set_webhook(params)
+        elif method == "deleteWebhook":
+            self._set_webhook({})
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id") or 0)
+            self._record(chat_id, method, params.get("text", ""))
+            markup = params.get("reply_markup")
+            if markup:
+                self.markups[chat_id] = json.loads(markup) if isinstance(markup, str) else markup
+            result = self._message(chat_id, text=params.get("text", ""))
+        elif method == "sendDocument":
+            chat_id = int(params["chat_id"])
+            document = params.get("document")
+            file_id = document if isinstance(document, str) else f"file{self.message_id}"
+            self._record(chat_id, method, file_id)
+            result = self._message(chat_id, document={"file_id": file_id, "file_unique_id": file_id})
+        return web.json_response({"ok": True, "result": result})
+
+    def texts(self, chat_id):
+        return [payload for kind, payload in self.sent.get(chat_id, []) if kind != "sendDocument"]
+
+    def buttons(self, chat_id):
+        """Инлайн-кнопки последнего сообщения чату: [(текст, callback_data)]"""
+        rows = self.markups.get(chat_id, {}).get("inline_keyboard", [])
+        return [(b.get("text", ""), b.get("callback_data")) for row in rows for b in row]
+
+    def count(self, *methods):
+        return sum(self.calls[m] for m in methods)
+
+    async def wait_for(self, predicate, timeout=60.0, interval=0.01):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError("Bot API: не дождались ожидаемых вызовов")
+            await asyncio.sleep(interval)
+
+    # ------------------- ЗАПУСК -------------------
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([web.post("/bot{token}/{method}", self.handle)])
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        self._set_webhook({})
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+if __name__ == "__main__":
+    # python benchmarks/fake_bot_api.py [порт] — отдельный процесс для ручных проверок
+    import sys
+
+    async def serve():
+        api = FakeBotAPI()
+        url = await api.start(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
+        print(json.dumps({"url": url}))
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
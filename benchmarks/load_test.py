@@ -0,0 +1,190 @@
+# benchmarks/load_test.py
+"""
+Нагрузочный прогон bot.py против локального Bot API (fake_bot_api.py).
+
+Каждый из --users пользователей --rounds раз проходит сценарий: добавляет задачу
+(«➕ Добавить задачу» → «На сегодня» → текст), открывает «📋 Мои задачи», «🔔 Мои напоминания»,
+останавливает и возобновляет напоминание кнопками и жмёт «📖 5 минут». Пользователи идут
+параллельно, шаги одного пользователя — по очереди, следующий после ответа на предыдущий.
+
+Измеряется:
+  • время обработки апдейта хендлерами (p50/p95/p99/max, всего и по шагам);
+  • апдейтов в секунду;
+  • рост RSS процесса за прогон;
+  • байты, записанные на диск (/proc/self/io), всего и на апдейт — с финальным сбросом данных.
+
+    python benchmarks/load_test.py [--users 100] [--rounds 3] [--latency 0.02] [--backend json|sqlite|sharded]
+
+Вывод — одна строка JSON (с хешем коммита), чтобы сравнивать версии между собой.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI, text_update, callback_update
+
+# ------------------- ИЗМЕРЕНИЯ ПРОЦЕССА -------------------
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # не Linux: только пиковое значение (на macOS — в байтах, на остальных — в КиБ)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def disk_write_bytes():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines() if line)
+        return int(fields["write_bytes"])
+    except (OSError, KeyError):
+        return None
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        "count": len(values),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ------------------- ТРАФИК -------------------
+class LoadRun:
+    """Подаёт апдейты в очередь приложения и замеряет время хендлеров через TypeHandler-ы по краям"""
+
+    def __init__(self, bot, app, api):
+        self.bot = bot
+        self.app = app
+        self.api = api
+        # id(update) -> [шаг, начало обработки, future с окончанием]
+        self.pending = {}
+        self.latencies = {}
+        app.add_handler(bot.TypeHandler(bot.Update, self.on_start), group=-1000)
+        app.add_handler(bot.TypeHandler(bot.Update, self.on_done), group=1000)
+
+    async def on_start(self, update, context):
+        self.pending[id(update)][1] = time.perf_counter()
+
+    async def on_done(self, update, context):
+        step, started, done = self.pending.pop(id(update))
+        self.latencies.setdefault(step, []).append(time.perf_counter() - started)
+        done.set_result(None)
+
+    async def send(self, step, data):
+        update = self.bot.Update.de_json(dict(data, update_id=0), self.app.bot)
+        done = asyncio.get_running_loop().create_future()
+        self.pending[id(update)] = [step, None, done]
+        await self.app.update_queue.put(update)
+        await done
+
+    async def press(self, step, user_id, icon):
+        """Инлайн-кнопка последнего сообщения, текст которой начинается с icon"""
+        for text, data in self.api.buttons(user_id):
+            if text.startswith(icon) and data:
+                await self.send(step, callback_update(user_id, data, self.api.texts(user_id)[-1]))
+                return True
+        return False
+
+    async def user_session(self, user_id, rounds):
+        for n in range(rounds):
+            await self.send("add_task", text_update(user_id, "➕ Добавить задачу"))
+            await self.send("add_task", text_update(user_id, "На сегодня"))
+            await self.send("add_task", text_update(user_id, f"задача {user_id}-{n}"))
+            await self.send("list_tasks", text_update(user_id, "📋 Мои задачи"))
+            await self.send("list_reminders", text_update(user_id, "🔔 Мои напоминания"))
+            await self.press("toggle_reminder", user_id, "⏸")
+            await self.press("toggle_reminder", user_id, "▶")
+            await self.send("pdf", text_update(user_id, "📖 5 минут"))
+
+    def updates(self):
+        return sum(len(v) for v in self.latencies.values())
+
+def seed_reminders(bot, user_ids):
+    for user_id in user_ids:
+        rem = {"text": f"напоминание {user_id}", "time": "09:00", "type": "Ежедневно", "enabled": True, "fired_today": False}
+        rem = bot.storage.add("reminders", str(user_id), rem)
+        bot.index_reminder(str(user_id), rem)
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    # данные бота — во временной папке; PDF подключаем ссылкой, чтобы не копировать
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    os.symlink(os.path.join(ROOT, "pdfs"), os.path.join(workdir, "pdfs"))
+    os.chdir(workdir)
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    import bot
+
+    user_ids = [1_000_000 + i for i in range(args.users)]
+    seed_reminders(bot, user_ids)
+    app = bot.build_application(webhook=True, base_url=f"{api.url}/bot", concurrent_updates=args.concurrent_updates)
+    run = LoadRun(bot, app, api)
+    async with app:
+        await app.start()
+        rss_start = rss_bytes()
+        disk_start = disk_write_bytes()
+        started = time.monotonic()
+        await asyncio.gather(*(run.user_session(u, args.rounds) for u in user_ids))
+        elapsed = time.monotonic() - started
+        await app.stop()
+    # отложенные записи тоже считаются в байты на диск
+    await bot.flush_on_shutdown(app)
+    rss_end = rss_bytes()
+    disk_end = disk_write_bytes()
+    await api.stop()
+
+    updates = run.updates()
+    disk = None if disk_start is None else disk_end - disk_start
+    result = {
+        "commit": git_commit(),
+        "backend": args.backend,
+        "users": args.users,
+        "rounds": args.rounds,
+        "concurrent_updates": args.concurrent_updates,
+        "latency_s": api.latency,
+        "updates": updates,
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1),
+        "handler_latency": percentiles([v for values in run.latencies.values() for v in values]),
+        "handler_latency_by_step": {step: percentiles(values) for step, values in sorted(run.latencies.items())},
+        "rss_start_bytes": rss_start,
+        "rss_growth_bytes": rss_end - rss_start,
+        "disk_write_bytes": disk,
+        "disk_bytes_per_update": None if disk is None else round(disk / updates, 1),
+        "api_calls": dict(api.calls),
+    }
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--backend", choices=["json", "sqlite", "sharded"], default="json")
+    parser.add_argument("--concurrent-updates", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
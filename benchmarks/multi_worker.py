@@ -0,0 +1,159 @@
+# benchmarks/multi_worker.py
+"""
+Несколько процессов bot.py с общей базой SQLite против локального Bot API.
+
+Запускает --workers воркеров (WORKER_COUNT/WORKER_ID/WORKER_URLS), заранее кладёт в базу
+по ежедневному напоминанию на каждого пользователя на ближайшую минуту и гонит диалог
+«➕ Добавить задачу» → «На сегодня» → текст → «📋 Мои задачи» через вебхук (или polling)
+воркера 0 — он пересылает чужие апдейты владельцам. Проверяем, что на каждый апдейт
+пришёл ровно один ответ, задача сохранена один раз, а каждое напоминание сработало
+ровно один раз, хотя планировщик есть у каждого воркера.
+
+    python benchmarks/multi_worker.py [--workers 3] [--users 60] [--mode webhook|polling] [--latency 0.01]
+
+Вывод — одна строка JSON. Ждёт срабатывания напоминаний, поэтому идёт до двух минут.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI, text_update
+from storage import SqliteStorage
+
+SCRIPT = ["➕ Добавить задачу", "На сегодня", None, "📋 Мои задачи"]
+SECRET = "bench-secret"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def seed_reminders(db_path, user_ids):
+    """Ежедневное напоминание каждому на начало следующей минуты (+ запас на запуск воркеров)"""
+    fire_at = (datetime.now() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+    if (fire_at - datetime.now()).total_seconds() < 20:
+        fire_at += timedelta(minutes=1)
+    db = SqliteStorage(db_path)
+    for user_id in user_ids:
+        db.add("reminders", str(user_id), {
+            "text": f"напоминание {user_id}",
+            "time": fire_at.strftime("%H:%M"),
+            "type": "Ежедневно",
+            "enabled": True,
+            "fired_today": False,
+        })
+    db.conn.close()
+    return fire_at
+
+def start_workers(args, workdir, api_url, ports):
+    urls = ",".join(f"http://127.0.0.1:{p}" for p in ports)
+    workers = []
+    for worker_id, port in enumerate(ports):
+        env = dict(
+            os.environ,
+            TELEGRAM_TOKEN="123456:bench",
+            BOT_API_URL=f"{api_url}/bot",
+            BOT_MODE=args.mode,
+            WEBHOOK_URL=f"http://127.0.0.1:{ports[0]}",
+            WEBHOOK_SECRET=SECRET,
+            STORAGE_BACKEND="sqlite",
+            SQLITE_PATH=os.path.join(workdir, "bot.db"),
+            REMINDER_MODE="jobs",
+            WORKER_COUNT=str(len(ports)),
+            WORKER_ID=str(worker_id),
+            WORKER_URLS=urls,
+            PORT=str(port),
+        )
+        log = open(os.path.join(workdir, f"worker{worker_id}.log"), "w")
+        workers.append(subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "bot.py")], cwd=workdir, env=env, stdout=log, stderr=log,
+        ))
+    return workers
+
+async def wait_healthy(ports, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        for port in ports:
+            while True:
+                try:
+                    async with session.get(f"http://127.0.0.1:{port}/healthz") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"воркер на порту {port} не поднялся")
+                await asyncio.sleep(0.2)
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    user_ids = [1_000_000 + i for i in range(args.users)]
+    fire_at = seed_reminders(os.path.join(workdir, "bot.db"), user_ids)
+
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    ports = [free_port() for _ in range(args.workers)]
+    workers = start_workers(args, workdir, api.url, ports)
+    try:
+        await wait_healthy(ports)
+        started = time.monotonic()
+        for step in SCRIPT:
+            for user_id in user_ids:
+                api.push_update(text_update(user_id, step or f"задача {user_id}"))
+        await api.wait_for(lambda: api.count("sendMessage") >= len(user_ids) * len(SCRIPT))
+        elapsed = time.monotonic() - started
+
+        reminder_texts = {u: f"🔔 Напоминание: напоминание {u}" for u in user_ids}
+        fired = lambda: sum(1 for u in user_ids if reminder_texts[u] in api.texts(u))
+        timeout = (fire_at - datetime.now()).total_seconds() + 30
+        await api.wait_for(lambda: fired() == len(user_ids), timeout=timeout)
+        # запас, чтобы заметить повторное срабатывание на другом воркере
+        await asyncio.sleep(3)
+    finally:
+        for worker in workers:
+            worker.send_signal(signal.SIGTERM)
+        for worker in workers:
+            worker.wait(timeout=30)
+        await api.stop()
+
+    db = SqliteStorage(os.path.join(workdir, "bot.db"))
+    replies = {u: [t for t in api.texts(u) if t != reminder_texts[u]] for u in user_ids}
+    updates = len(user_ids) * len(SCRIPT)
+    result = {
+        "workers": args.workers,
+        "mode": args.mode,
+        "users": args.users,
+        "updates": updates,
+        "latency_s": api.latency,
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1),
+        "one_reply_per_update": all(len(r) == len(SCRIPT) for r in replies.values()),
+        "tasks_saved_once": all(
+            [t["text"] for t in db.user_records("tasks", str(u))] == [f"задача {u}"] for u in user_ids
+        ),
+        "reminders_fired_once": all(api.texts(u).count(reminder_texts[u]) == 1 for u in user_ids),
+        "workdir": workdir,
+    }
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--mode", choices=["webhook", "polling"], default="webhook")
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка ответа Bot API, с")
+    asyncio.run(main(parser.parse_args()))
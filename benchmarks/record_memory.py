@@ -0,0 +1,180 @@
+# benchmarks/record_memory.py
+"""
+Память на запись в JsonStorage: dict против Record (records.py).
+
+Строит синтетические данные на --users пользователей (у каждого несколько задач,
+напоминаний, дней рождения и ивентов, как после недели работы бота), загружает их
+обоими способами и через tracemalloc считает байты на запись по видам и в целом.
+Заодно проверяет, что Record сериализуется обратно в тот же JSON.
+
+Затем те же данные переносятся в файлы пользователей (STORAGE_BACKEND=sharded), и выбор
+кандидатов утренней сводки идёт с кэшем на --cache-size пользователей: видно, сколько файлов
+прочитано (только у кого что-то есть сегодня) и что кэш не вырос сверх лимита.
+
+    python benchmarks/record_memory.py [--users 100000] [--seed 1] [--cache-size 1000]
+
+Вывод — одна строка JSON (с хешем коммита), чтобы сравнивать версии между собой.
+"""
+import os
+import gc
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from records import RECORD_TYPES
+from storage import new_id
+
+REMINDER_TYPES = ["Ежедневно", "На сегодня", "На другой день"]
+REPEATS = ["weekly", "monthly", "yearly"]
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ------------------- ДАННЫЕ -------------------
+def synthetic_json(users, seed):
+    """{вид: {user_id: [dict, ...]}} в виде JSON-строк — как файлы tasks.json и т.д."""
+    rng = random.Random(seed)
+    today = date.today()
+    data = {kind: {} for kind in RECORD_TYPES}
+    for n in range(users):
+        user_id = str(1_000_000 + n)
+        day = lambda: (today + timedelta(days=rng.randint(-3, 30))).isoformat()
+        data["tasks"][user_id] = [
+            {"id": new_id(), "text": f"задача {n}-{i}", "done": rng.random() < 0.3, "date": day()}
+            for i in range(rng.randint(1, 6))
+        ]
+        reminders = []
+        for i in range(rng.randint(0, 3)):
+            rem = {
+                "id": new_id(),
+                "text": f"напоминание {n}-{i}",
+                "time": f"{rng.randint(0, 23):02d}:{rng.choice([0, 15, 30, 45]):02d}",
+                "type": rng.choice(REMINDER_TYPES),
+                "enabled": rng.random() < 0.9,
+                "fired_today": False,
+            }
+            if rem["type"] == "На другой день":
+                rem["date"] = day()
+            reminders.append(rem)
+        data["reminders"][user_id] = reminders
+        data["birthdays"][user_id] = [
+            {"id": new_id(), "name": f"друг {n}-{i}", "date": f"--{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+            for i in range(rng.randint(0, 2))
+        ]
+        events = []
+        for i in range(rng.randint(0, 2)):
+            ev = {"id": new_id(), "title": f"ивент {n}-{i}", "date": day()}
+            if rng.random() < 0.5:
+                ev["repeat"] = rng.choice(REPEATS)
+            events.append(ev)
+        data["events"][user_id] = events
+    # через JSON, как при load_data: строки не разделяются между записями
+    return {kind: json.dumps(by_user, ensure_ascii=False) for kind, by_user in data.items()}
+
+def load_dicts(kind, text):
+    return json.loads(text)
+
+def load_records(kind, text):
+    record_type = RECORD_TYPES[kind]
+    return {user_id: [record_type.from_dict(r) for r in items] for user_id, items in json.loads(text).items()}
+
+def measure(loader, kind, text):
+    """Байт, удерживаемых загруженными данными (без учёта JSON-строки)"""
+    gc.collect()
+    tracemalloc.start()
+    data = loader(kind, text)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, size
+
+def digest_file_loads(files, cache_size):
+    """Сколько файлов пользователей читает утренняя сводка на STORAGE_BACKEND=sharded"""
+    from event_calendar import EventCalendar
+    from storage import JSON_FILES, UserShardStorage, migrate_json_to_shards, user_loads
+    workdir = tempfile.mkdtemp(prefix="bench_records_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for kind, text in files.items():
+            with open(JSON_FILES[kind], "w", encoding="utf-8") as f:
+                f.write(text)
+        migrate_json_to_shards()
+        storage = UserShardStorage(cache_size=cache_size)
+        calendar = EventCalendar(storage)
+        today = date.today()
+        day = today.isoformat()
+        loads = user_loads.value()
+        # как bot.digest_users и bot.build_digest
+        candidates = set(storage.users_between("tasks", day, day)) | calendar.users_on(today)
+        loads_selecting = user_loads.value() - loads
+        with_digest = sum(
+            1 for user_id in candidates if storage.records_between("tasks", user_id, day, day) or calendar.on(user_id, today)
+        )
+        result = {
+            "cache_size": cache_size,
+            "candidates": len(candidates),
+            "with_digest": with_digest,
+            "files_loaded_selecting": loads_selecting,
+            "files_loaded": user_loads.value() - loads,
+            "cached_users": len(storage.cache),
+            "cache_within_limit": len(storage.cache) <= cache_size,
+        }
+        storage.history.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def main(args):
+    files = synthetic_json(args.users, args.seed)
+    result = {"commit": git_commit(), "users": args.users, "by_kind": {}}
+    total = {"records": 0, "dict_bytes": 0, "record_bytes": 0}
+    for kind, text in files.items():
+        dicts, dict_bytes = measure(load_dicts, kind, text)
+        records, record_bytes = measure(load_records, kind, text)
+        count = sum(len(items) for items in dicts.values())
+        round_trip = all(
+            [r.to_dict() for r in records[user_id]] == items for user_id, items in dicts.items()
+        )
+        del dicts, records
+        result["by_kind"][kind] = {
+            "records": count,
+            "dict_bytes_per_record": round(dict_bytes / count, 1),
+            "record_bytes_per_record": round(record_bytes / count, 1),
+            "round_trip": round_trip,
+        }
+        total["records"] += count
+        total["dict_bytes"] += dict_bytes
+        total["record_bytes"] += record_bytes
+    result.update(
+        records=total["records"],
+        dict_bytes_per_record=round(total["dict_bytes"] / total["records"], 1),
+        record_bytes_per_record=round(total["record_bytes"] / total["records"], 1),
+        dict_total_mb=round(total["dict_bytes"] / 2**20, 1),
+        record_total_mb=round(total["record_bytes"] / 2**20, 1),
+        saved_percent=round(100 * (1 - total["record_bytes"] / total["dict_bytes"]), 1),
+    )
+    result["sharded_digest"] = digest_file_loads(files, args.cache_size)
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache-size", type=int, default=1000, help="USER_CACHE_SIZE для проверки сводки")
+    main(parser.parse_args())
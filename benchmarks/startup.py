@@ -0,0 +1,109 @@
+# benchmarks/startup.py
+"""
+Запуск хранилища на большой базе: JsonStorage против UserShardStorage (STORAGE_BACKEND=sharded).
+
+Записывает синтетические данные на --users пользователей (как в record_memory.py) в общие
+JSON-файлы, переносит их в файлы пользователей (migrate_json_to_shards) и для каждого
+хранилища в отдельном процессе замеряет:
+  • время создания хранилища и RSS после него;
+  • первое обращение к --touch случайным пользователям (мс на пользователя) и RSS после;
+  • первую выборку по всем пользователям (users_between по задачам).
+
+    python benchmarks/startup.py [--users 100000] [--touch 1000] [--cache-size 10000]
+
+Вывод — одна строка JSON (с хешем коммита), чтобы сравнивать версии между собой.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import rss_bytes, git_commit
+from record_memory import synthetic_json
+
+def prepare(workdir, users, seed):
+    from storage import JSON_FILES, migrate_json_to_shards
+    for kind, text in synthetic_json(users, seed).items():
+        with open(os.path.join(workdir, JSON_FILES[kind]), "w", encoding="utf-8") as f:
+            f.write(text)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        migrate_json_to_shards()
+    finally:
+        os.chdir(cwd)
+
+def child(args):
+    """Замер в чистом процессе: python startup.py --child <backend> ..."""
+    os.chdir(args.workdir)
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    from storage import JsonStorage, UserShardStorage
+    if args.child == "sharded":
+        storage = UserShardStorage(cache_size=args.cache_size)
+    else:
+        storage = JsonStorage()
+    startup = time.perf_counter() - started
+    rss_startup = rss_bytes()
+
+    rng = random.Random(args.seed)
+    touched = [str(1_000_000 + rng.randrange(args.users)) for _ in range(args.touch)]
+    started = time.perf_counter()
+    for user_id in touched:
+        storage.records_between("tasks", user_id, "", "9999-12-31")
+        storage.user_records("events", user_id)
+    touch = time.perf_counter() - started
+
+    started = time.perf_counter()
+    due = storage.users_between("tasks", "", "9999-12-31")
+    scan = time.perf_counter() - started
+    storage.history.close()
+    print(json.dumps({
+        "startup_s": round(startup, 3),
+        "rss_after_startup_bytes": rss_startup - rss_before,
+        "touch_ms_per_user": round(touch * 1000 / max(1, args.touch), 3),
+        "rss_after_touch_bytes": rss_bytes() - rss_before,
+        "users_between_s": round(scan, 3),
+        "users_with_tasks": len(due),
+    }))
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    started = time.monotonic()
+    prepare(workdir, args.users, args.seed)
+    result = {
+        "commit": git_commit(),
+        "users": args.users,
+        "touch": args.touch,
+        "cache_size": args.cache_size,
+        "prepare_s": round(time.monotonic() - started, 1),
+    }
+    for backend in ("json", "sharded"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", backend, "--workdir", workdir,
+             "--users", str(args.users), "--touch", str(args.touch),
+             "--cache-size", str(args.cache_size), "--seed", str(args.seed)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result[backend] = json.loads(output.strip().splitlines()[-1])
+    result["workdir"] = workdir
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--touch", type=int, default=1000)
+    parser.add_argument("--cache-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", choices=["json", "sharded"], help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    child(args) if args.child else main(args)
@@ -1,8 +1,16 @@
 # bot.py
 import os
-import json
+import asyncio
+import logging
+import time
 from dotenv import load_dotenv
+import re
 import random
+import signal
+import secrets
+import functools
+import httpx
+from collections import OrderedDict
 from telegram import InputFile
 from telegram.error import BadRequest
 from telegram import Update
@@ -19,35 +27,233 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
+    ApplicationHandlerStop,
     filters,
 )
-from telegram.error import BadRequest
-from datetime import datetime, timedelta, time as dt_time
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+from datetime import datetime, timedelta, timezone, time as dt_time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from storage import SAVE_DELAY, STORAGE_BACKEND, WriteBehindStore, open_storage, load_data, save_data_async
+from event_calendar import EventCalendar, REPEAT_CHOICES, REPEAT_LABELS, REPEAT_NONE
+from pdf_catalog import PDF_DIR, load_catalog, catalog_version, rotation_index
+import webserver
+import metrics
+from metrics import Counter, Gauge, Histogram
+from user_updates import PerUserUpdateProcessor, update_user_key
+from callbacks import TOKEN_PREFIX, callback_data, parse_callback
+from workers import WORKER_COUNT, WORKER_ID, UpdateForwarder, check_config, owns, partition, worker_file
 
 # ------------------- НАСТРОЙКИ -------------------
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
-TASKS_FILE = "tasks.json"
-REMINDERS_FILE = "reminders.json"
-BIRTHDAYS_FILE = "birthdays.json"
-EVENTS_FILE = "events.json"
-TASKS_HISTORY_FILE = "tasks_history.json"
+# Режим напоминаний: "jobs" — отдельная задача JobQueue на каждое напоминание,
+# "polling" — проверка индекса раз в минуту (reminder_checker)
+REMINDER_MODE = os.getenv("REMINDER_MODE", "jobs")
+# Локальная зона сервера: JobQueue без tzinfo считает время в UTC
+def local_zone():
+    """Зона сервера с переходами на летнее время; если её не определить — текущее смещение (без переходов)"""
+    try:
+        # tzlocal ставится вместе с APScheduler (python-telegram-bot[job-queue]): TZ, /etc/localtime, Windows
+        from tzlocal import get_localzone
+        return get_localzone()
+    except (ImportError, LookupError, ValueError, OSError):
+        pass
+    try:
+        return ZoneInfo(os.getenv("TZ", "").lstrip(":"))
+    except (ZoneInfoNotFoundError, ValueError):
+        pass
+    tz = datetime.now().astimezone().tzinfo
+    logging.getLogger(__name__).warning("Не удалось определить зону сервера (задайте TZ=Europe/Moscow): смещение %s без перехода на летнее время", tz)
+    return tz
+
+LOCAL_TZ = local_zone()
+
+# Приём апдейтов: "polling" — long polling, "webhook" — POST от Telegram на WEBHOOK_URL + WEBHOOK_PATH,
+# обслуживается aiohttp-приложением из webserver.py. Без WEBHOOK_URL остаёмся на polling.
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# секрет из A-Z, a-z, 0-9, _ и -; если не задан — новый при каждом запуске (setWebhook его обновит)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+PORT = int(os.getenv("PORT", "8000"))
+# адрес Bot API, например локальной заглушки из benchmarks/ (по умолчанию — api.telegram.org)
+BOT_API_URL = os.getenv("BOT_API_URL") or None
+
+# Сколько апдейтов обрабатывать одновременно (разных пользователей); 1 — строго по одному, как раньше.
+# Выше ~32 упирается в накладные расходы httpx на пул соединений (benchmarks/concurrent_updates.py)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+
+# Лимиты рассылки (флуд-лимиты Telegram): ~30 сообщений/с на бота и ~1/с в один чат
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", "1.0"))
+SEND_MAX_RETRIES = 3
+# RetryAfter не считается попыткой: ждём, сколько просит Telegram, но в сумме не дольше этого, с
+SEND_MAX_WAIT = float(os.getenv("SEND_MAX_WAIT", "600"))
+
+# Утренняя сводка: время начала и за сколько минут растянуть рассылку
+DIGEST_TIME = os.getenv("DIGEST_TIME", "08:00")
+DIGEST_SPREAD_MINUTES = int(os.getenv("DIGEST_SPREAD_MINUTES", "60"))
+
+logger = logging.getLogger(__name__)
+
+# ------------------- МЕТРИКИ -------------------
+# Выдаются на GET /metrics (webserver.py); save_data меряет себя сам в storage.py
+handler_duration = Histogram("bot_handler_seconds", "Время обработки апдейта хендлером", ["handler"])
+handler_errors = Counter("bot_handler_errors_total", "Исключения в хендлерах по типу", ["handler", "error"])
+api_requests = Counter("bot_telegram_requests_total", "Запросы к Bot API", ["method"])
+api_errors = Counter("bot_telegram_errors_total", "Ошибки Bot API по типу", ["method", "error"])
+reminder_tick_duration = Histogram("bot_reminder_tick_seconds", "Длительность тика reminder_checker")
+reminders_due = Counter("bot_reminders_due_total", "Напоминаний подошло к отправке")
+reminders_delivered = Counter("bot_reminders_delivered_total", "Напоминаний доставлено")
+update_queue_size = Gauge("bot_update_queue_size", "Апдейтов ждут в очереди на обработку")
+
+def pending_updates(app):
+    """
+    Апдейты, ещё не взятые в обработку. С concurrent_updates PTB сразу забирает их из update_queue
+    и создаёт задачи, так что настоящая очередь — ожидающие в PerUserUpdateProcessor
+    """
+    return app.update_queue.qsize() + getattr(app.update_processor, "waiting_updates", 0)
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, считающий запросы к Bot API и ошибки по методу и типу исключения"""
 
-# ------------------- УТИЛИТЫ -------------------
-def load_data(file):
-    if os.path.exists(file):
+    async def post(self, url, *args, **kwargs):
+        method = url.rsplit("/", 1)[-1]
+        api_requests.inc(method=method)
         try:
-            with open(file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+            return await super().post(url, *args, **kwargs)
+        except TelegramError as e:
+            api_errors.inc(method=method, error=type(e).__name__)
+            raise
+
+def timed_callback(callback):
+    """Обёртка хендлера: время в bot_handler_seconds, исключения — в bot_handler_errors_total"""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with handler_duration.time(handler=name):
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                raise
+            except Exception as e:
+                handler_errors.inc(handler=name, error=type(e).__name__)
+                raise
+    return wrapper
+
+def instrument_handlers(handlers):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            states = [h for state_handlers in handler.states.values() for h in state_handlers]
+            instrument_handlers(handler.entry_points + states + handler.fallbacks)
+        else:
+            handler.callback = timed_callback(handler.callback)
 
-def save_data(file, data):
-    with open(file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# ------------------- ОТПРАВКА С ОГРАНИЧЕНИЕМ СКОРОСТИ -------------------
+class SendLimiter:
+    """
+    Раздаёт слоты отправки: не чаще global_rate в секунду на бота
+    и не чаще одного сообщения в chat_interval секунд в один чат.
+    Слоты резервируются без await, поэтому корутины не мешают друг другу.
+    Пауза после RetryAfter действует и на тех, кто уже ждёт своего слота:
+    проснувшись, корутина сверяется с pause_until и при необходимости берёт новый слот.
+    """
 
+    def __init__(self, global_rate, chat_interval):
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = chat_interval
+        self.global_next = 0.0
+        self.pause_until = 0.0
+        self.chat_next = {}
+
+    def pause(self, seconds):
+        """Останавливает все отправки на seconds (после RetryAfter)"""
+        self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+        self.global_next = max(self.global_next, self.pause_until)
+
+    async def acquire(self, chat_id):
+        now = time.monotonic()
+        if len(self.chat_next) > 10000:
+            self.chat_next = {c: t for c, t in self.chat_next.items() if t > now}
+        chat_slot = max(now, self.chat_next.get(chat_id, 0.0))
+        self.chat_next[chat_id] = chat_slot + self.chat_interval
+        if chat_slot > now:
+            await asyncio.sleep(chat_slot - now)
+
+        while True:
+            now = time.monotonic()
+            if now < self.pause_until:
+                await asyncio.sleep(self.pause_until - now)
+                continue
+            slot = max(now, self.global_next)
+            self.global_next = slot + self.global_interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            # пока спали, мог прийти RetryAfter — тогда слот недействителен
+            if time.monotonic() >= self.pause_until:
+                return
+
+send_limiter = SendLimiter(SEND_GLOBAL_RATE, SEND_CHAT_INTERVAL)
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+def request_not_sent(error: NetworkError) -> bool:
+    """Сбой до отправки запроса (соединение не установлено) — повтор не создаст дубль"""
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+async def send_limited(bot, chat_id, text, **kwargs) -> bool:
+    """
+    Отправка с учётом лимитов: при RetryAfter ждёт и повторяет (не дольше SEND_MAX_WAIT в сумме,
+    попыткой это не считается), сетевые ошибки повторяет до SEND_MAX_RETRIES раз.
+    Если запрос мог дойти до Telegram (таймаут ответа, обрыв), повтор может прислать дубль — пишем в лог.
+    """
+    attempt = 0
+    waited = 0.0
+    while True:
+        await send_limiter.acquire(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return True
+        except RetryAfter as e:
+            delay = retry_after_seconds(e)
+            waited += delay
+            if waited > SEND_MAX_WAIT:
+                logger.warning("Сообщение в чат %s не доставлено: ожидание RetryAfter больше %.0f с", chat_id, SEND_MAX_WAIT)
+                return False
+            send_limiter.pause(delay)
+            continue
+        except (BadRequest, Forbidden) as e:
+            # пользователь заблокировал бота, чат не найден и т.п. — повторять бессмысленно
+            logger.warning("Сообщение в чат %s не доставлено: %s", chat_id, e)
+            return False
+        except NetworkError as e:
+            if attempt >= SEND_MAX_RETRIES:
+                logger.warning("Сообщение в чат %s не доставлено после %d попыток: %s", chat_id, attempt + 1, e)
+                return False
+            if not request_not_sent(e):
+                logger.warning("Сообщение в чат %s: %s, запрос мог дойти — повтор может дать дубль", chat_id, e)
+            await asyncio.sleep(2 ** attempt)
+            attempt += 1
+        except TelegramError as e:
+            logger.warning("Сообщение в чат %s не доставлено: %s", chat_id, e)
+            return False
+
+async def deliver_batch(bot, messages, label="рассылка"):
+    """Параллельно отправляет [(chat_id, text), ...] и пишет в лог время доставки пачки"""
+    started = time.monotonic()
+    results = await asyncio.gather(*(send_limited(bot, chat_id, text) for chat_id, text in messages))
+    logger.info("%s: доставлено %d из %d за %.2f с", label, sum(results), len(messages), time.monotonic() - started)
+    return results
+
+# ------------------- УТИЛИТЫ -------------------
 def get_user_id_from_update(update: Update) -> str:
     """Возвращаем строковый user_id (используем effective_user)"""
     if update.effective_user:
@@ -81,6 +287,10 @@ async def send_or_edit(update: Update, text: str, reply_markup=None):
         elif update.callback_query:
             # callback
             if reply_markup is None or isinstance(reply_markup, InlineKeyboardMarkup):
+                # Telegram обрезает пробелы по краям текста — сравниваем так же и не зовём API впустую
+                message = update.callback_query.message
+                if message and message.text == text.strip() and message.reply_markup == reply_markup:
+                    return None
                 try:
                     return await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
                 except BadRequest as e:
@@ -99,25 +309,273 @@ async def send_or_edit(update: Update, text: str, reply_markup=None):
                 except BadRequest:
                     pass
                 return await update.callback_query.message.reply_text(text, reply_markup=reply_markup)
-    except Exception:
-        # как последний вариант — если что-то сломалось, постим обычное сообщение в чат
+    except TelegramError as e:
+        # как последний вариант — если Telegram отказал, постим обычное сообщение в чат
+        logger.warning("send_or_edit: ответ в чат %s не отправлен: %s", update.effective_chat and update.effective_chat.id, e)
         try:
             if update.effective_chat:
                 return await update.effective_chat.send_message(text)
-        except Exception:
+        except TelegramError as e:
+            logger.warning("send_or_edit: запасная отправка тоже не удалась: %s", e)
             return None
 
 # ------------------- ХРАНЕНИЕ ДАННЫХ -------------------
-tasks = load_data(TASKS_FILE)
-reminders = load_data(REMINDERS_FILE)
-birthdays = load_data(BIRTHDAYS_FILE)
-events = load_data(EVENTS_FILE)
-tasks_history = load_data(TASKS_HISTORY_FILE)
+# JSON-файлы (по умолчанию), файл на пользователя (sharded) или SQLite — см. STORAGE_BACKEND в storage.py
+storage = open_storage()
+# дни рождения и ивенты с повтором: индекс ближайших наступлений по пользователю
+event_calendar = EventCalendar(storage)
+# служебные файлы вне хранилища (кэш file_id) пишутся тем же отложенным способом
+file_writer = WriteBehindStore(SAVE_DELAY)
+# user_id -> {"digest": bool, "tz": ..., "pdf_rotation": ...}: личные настройки пользователя.
+# Хранятся в storage (при нескольких воркерах — общие), здесь — копия для чтения без запросов:
+# настройки пользователя меняет только воркер, которому он принадлежит.
+user_settings = dict(storage.all_user_settings())
+
+def update_user_setting(user_id, key, value):
+    settings = user_settings.setdefault(user_id, {})
+    settings[key] = value
+    storage.set_user_settings(user_id, settings)
+
+# ------------------- ЧАСОВЫЕ ПОЯСА -------------------
+# user_settings[user_id]["tz"] — имя зоны IANA ("Europe/Moscow") или смещение "UTC+03:00".
+# Пользователи без настройки живут в зоне сервера (имя зоны "").
+# Планировщики работают не по пользователям, а по группам зон с одинаковым смещением от UTC.
+TZ_OFFSET_RE = re.compile(r"^(?:UTC|GMT)?\s*([+-])(\d{1,2})(?::?(\d{2}))?$", re.IGNORECASE)
+# минуты смещения: как у настоящих поясов (+5:30, +5:45); тик зон идёт по 5-минуткам UTC,
+# и при смещении вроде +3:07 RESET_TIME и DIGEST_TIME у пользователя никогда не наступили бы
+TZ_OFFSET_MINUTES = (0, 15, 30, 45)
+tz_cache = {"": LOCAL_TZ}
+# имя зоны -> {user_id}: только пользователи с явно заданным поясом
+tz_users = {}
+
+def rebuild_tz_users():
+    tz_users.clear()
+    for user_id, settings in user_settings.items():
+        if settings.get("tz") and owns(user_id):
+            tz_users.setdefault(settings["tz"], set()).add(user_id)
+
+def parse_tz(text):
+    """Имя зоны IANA или смещение (+3, UTC+03:00, GMT-5) -> (имя зоны, tzinfo) или None"""
+    text = text.strip()
+    match = TZ_OFFSET_RE.match(text)
+    if match:
+        sign, hours, minutes = match.group(1), int(match.group(2)), int(match.group(3) or 0)
+        if hours > 14 or minutes not in TZ_OFFSET_MINUTES:
+            return None
+        name = f"UTC{sign}{hours:02d}:{minutes:02d}"
+        offset = timedelta(hours=hours, minutes=minutes) * (-1 if sign == "-" else 1)
+        return name, timezone(offset)
+    try:
+        return text, ZoneInfo(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def zone_of(user_id):
+    return user_settings.get(user_id, {}).get("tz", "")
+
+def tz_by_name(name):
+    tz = tz_cache.get(name)
+    if tz is None:
+        parsed = parse_tz(name)
+        tz = parsed[1] if parsed else LOCAL_TZ
+        tz_cache[name] = tz
+    return tz
+
+def user_tz(user_id):
+    return tz_by_name(zone_of(user_id))
+
+def user_now(user_id):
+    return datetime.now(user_tz(user_id))
+
+def offset_groups(now_utc):
+    """{смещение в минутах: [имена зон]} на момент now_utc; зона сервера "" есть всегда"""
+    groups = {}
+    for name in [""] + [z for z, users in tz_users.items() if users]:
+        offset = int(now_utc.astimezone(tz_by_name(name)).utcoffset().total_seconds() // 60)
+        groups.setdefault(offset, []).append(name)
+    return groups
+
+def in_zones(user_id, zones):
+    return zone_of(user_id) in zones
+
+rebuild_tz_users()
+
+# ------------------- ИНДЕКС НАПОМИНАНИЙ -------------------
+# Корзины по минутам местного времени: (зона, "HH:MM") для ежедневных и «На сегодня»,
+# (зона, "YYYY-MM-DD HH:MM") для напоминаний «На другой день».
+# Значение корзины: {rem["id"]: (user_id, rem)}. В индексе только включённые напоминания,
+# поэтому reminder_checker трогает лишь то, что должно сработать в эту минуту.
+reminder_index = {}
+# зона -> ключи её корзин: ежедневный сброс группы зон обходит только их
+reminder_zone_buckets = {}
+
+def reminder_bucket(user_id, rem):
+    if rem.get("type") == "На другой день" and rem.get("date"):
+        return zone_of(user_id), f"{rem['date']} {rem.get('time')}"
+    return zone_of(user_id), rem.get("time")
+
+def index_reminder(user_id, rem):
+    if not rem.get("enabled", True):
+        return
+    key = reminder_bucket(user_id, rem)
+    reminder_index.setdefault(key, {})[rem["id"]] = (user_id, rem)
+    reminder_zone_buckets.setdefault(key[0], set()).add(key)
+
+def unindex_reminder(user_id, rem):
+    key = reminder_bucket(user_id, rem)
+    bucket = reminder_index.get(key)
+    if bucket is None:
+        return
+    bucket.pop(rem["id"], None)
+    if not bucket:
+        del reminder_index[key]
+        keys = reminder_zone_buckets[key[0]]
+        keys.discard(key)
+        if not keys:
+            del reminder_zone_buckets[key[0]]
+
+def rebuild_reminder_index():
+    reminder_index.clear()
+    reminder_zone_buckets.clear()
+    for user_id, rem in storage.enabled_reminders():
+        if owns(user_id):
+            index_reminder(user_id, rem)
+
+def drop_reminder(user_id, rem):
+    unindex_reminder(user_id, rem)
+    storage.delete("reminders", user_id, rem["id"])
+
+def indexed_reminder(user_id, rem):
+    """Запись напоминания из индекса; в SQLite у задачи JobQueue своя копия, и пометка на ней индекс не меняет"""
+    entry = reminder_index.get(reminder_bucket(user_id, rem), {}).get(rem["id"])
+    return entry[1] if entry else rem
+
+def mark_reminder_fired(user_id, rem):
+    """Состояние после срабатывания: разовое «На сегодня» удаляем, остальные помечаем"""
+    if rem.get("type") == "На сегодня":
+        drop_reminder(user_id, rem)
+    else:
+        # помечаем и копию в индексе: по ней ежедневный сброс решает, что сбрасывать
+        rem["fired_today"] = True
+        indexed = indexed_reminder(user_id, rem)
+        indexed["fired_today"] = True
+        storage.update("reminders", user_id, indexed)
+
+rebuild_reminder_index()
+
+# ------------------- КЭШ ОТРИСОВКИ -------------------
+# Готовые (текст, клавиатура) для «Мой день», «Мой месяц» и списков.
+# Ключ — (user_id, вид), штамп — версия данных пользователя и текущая дата:
+# любое изменение в storage или смена дня делают запись устаревшей.
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+def markup_size(markup):
+    if not isinstance(markup, InlineKeyboardMarkup):
+        return 0
+    return sum(len(b.text) + len(b.callback_data or "") for row in markup.inline_keyboard for b in row)
+
+class RenderCache:
+    """LRU по (user_id, вид) с ограничением по примерному размеру текста и кнопок"""
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, stamp):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, stamp, text, markup):
+        self.discard(key)
+        size = len(text.encode()) + markup_size(markup)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (stamp, text, markup, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, _, old_size) = self.entries.popitem(last=False)
+            self.size -= old_size
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[3]
+
+render_cache = RenderCache()
+
+def cached_render(user_id, view, build):
+    """build(user_id) -> (текст, клавиатура); повторный показ без изменений берётся из кэша"""
+    stamp = (storage.version(user_id), user_now(user_id).strftime("%Y-%m-%d"))
+    cached = render_cache.get((user_id, view), stamp)
+    if cached is not None:
+        return cached
+    text, markup = build(user_id)
+    render_cache.put((user_id, view), stamp, text, markup)
+    return text, markup
+
+def ru_date(iso):
+    """"YYYY-MM-DD" -> "DD.MM.YYYY" срезами, без strptime на каждую строку"""
+    return f"{iso[8:10]}.{iso[5:7]}.{iso[:4]}"
+
+# ------------------- СТРАНИЦЫ СПИСКОВ -------------------
+# Задачи, напоминания и события показываются по PAGE_SIZE пунктов с кнопками «◀ ▶».
+# Номер страницы едет в callback data, а страница выбирается из индекса по смещению,
+# так что цена показа не зависит от того, сколько записей накопил пользователь.
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "8"))
+# длинный текст пункта обрезаем: страница должна влезать в лимит сообщения (4096 символов)
+LIST_ITEM_MAX_CHARS = 200
+
+def clip(text):
+    return text if len(text) <= LIST_ITEM_MAX_CHARS else text[:LIST_ITEM_MAX_CHARS - 1] + "…"
+
+def paginate(counts, page):
+    """
+    Страница сквозного списка из нескольких частей с размерами counts.
+    -> (страница, всего страниц, [(часть, смещение в части, сколько взять)])
+    """
+    pages = max(1, -(-sum(counts) // PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    start, end = page * PAGE_SIZE, (page + 1) * PAGE_SIZE
+    slices = []
+    pos = 0
+    for part, count in enumerate(counts):
+        lo, hi = max(start, pos), min(end, pos + count)
+        if lo < hi:
+            slices.append((part, lo - pos, hi - lo))
+        pos += count
+    return page, pages, slices
+
+def page_buttons(kind, page, pages):
+    """Ряд навигации «◀ 2/5 ▶»; для одной страницы — ничего"""
+    if pages <= 1:
+        return []
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("◀", callback_data=callback_data(kind, "page", page - 1)))
+    row.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=callback_data(kind, "page", page)))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton("▶", callback_data=callback_data(kind, "page", page + 1)))
+    return [row]
+
+def callback_page(data, position):
+    """Номер страницы из callback data (или 0, если его нет — кнопки до постраничного вида)"""
+    try:
+        return int(data[position]) if data and len(data) > position else 0
+    except ValueError:
+        return 0
 
 # ------------------- СОСТОЯНИЯ CONVERSATION -------------------
 ASK_TASK_DAY_TYPE, ASK_TASK_TEXT, ASK_TASK_OTHER_DATE = range(3)
 ASK_REM_TYPE, ASK_REM_TEXT, ASK_REM_DATE, ASK_REM_TIME = range(4)
-BDAY_NAME, BDAY_DATE, EVENT_TITLE, EVENT_DATE = range(6, 10)
+BDAY_NAME, BDAY_DATE, EVENT_TITLE, EVENT_DATE, EVENT_REPEAT = range(6, 11)
 
 # ------------------- START -------------------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -127,7 +585,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📝 Добавлять задачи на день, а также планировать их на дни вперед \n"
         "⏰ Ставить напоминания: на день, на предстоящий день или настроить ежедневные напоминания\n"
         "🎉 Сохранять события и получать уведомления — например, дни рождения друзей\n"
-        "📄 Получать полезные файлы для быстрого 5-минутного чтения\n\n"
+        "📄 Получать полезные файлы для быстрого 5-минутного чтения\n"
+        "☀ Получать утреннюю сводку дня (/digest — включить или выключить)\n"
+        "🕒 Жить по своему часовому поясу (/tz — посмотреть или изменить)\n\n"
         "Используй кнопки внизу. В любой момент нажми «Отмена», чтобы вернуться в главное меню."
     )
        
@@ -159,64 +619,82 @@ async def add_task_other_date(update: Update, context: ContextTypes.DEFAULT_TYPE
         context.user_data["task_other_date"] = d
         await send_or_edit(update, "✍ Введите текст задачи для указанной даты:")
         return ASK_TASK_TEXT
-    except Exception:
+    except ValueError:
         await send_or_edit(update, "⚠ Неверный формат. Попробуйте ДД.MM.ГГГГ или нажмите Отмена.")
         return ASK_TASK_OTHER_DATE
 
 async def add_task_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = get_user_id_from_update(update)
     if context.user_data.get("task_day_type") == "today":
-        date_str = datetime.now().strftime("%Y-%m-%d")
+        date_str = user_now(user_id).strftime("%Y-%m-%d")
     else:
         date_obj = context.user_data.get("task_other_date")
         date_str = date_obj.strftime("%Y-%m-%d")
     text = update.message.text
-    tasks.setdefault(user_id, []).append({"text": text, "done": False, "date": date_str})
-    save_data(TASKS_FILE, tasks)
+    storage.add("tasks", user_id, {"text": text, "done": False, "date": date_str})
     await send_or_edit(update, f"✅ Задача добавлена: {text}", reply_markup=main_menu_keyboard())
     context.user_data.pop("task_day_type", None)
     context.user_data.pop("task_other_date", None)
     return ConversationHandler.END
 
-async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = get_user_id_from_update(update)
-    today = datetime.now().strftime("%Y-%m-%d")
-    user_tasks = tasks.get(user_id, [])
-    today_tasks = [t for t in user_tasks if t.get("date") == today]
-    other_tasks = [t for t in user_tasks if t.get("date") != today]
-
-    msg = "📋 Задачи на сегодня:\n"
+def task_buttons(t, page):
+    if not t.get("done"):
+        return [InlineKeyboardButton("✔ Выполнено", callback_data=callback_data("task", "done", t["id"], page)),
+                InlineKeyboardButton("❌ Удалить", callback_data=callback_data("task", "del", t["id"], page))]
+    # если задача уже выполнена — показываем только кнопку удаления
+    return [InlineKeyboardButton("❌ Удалить", callback_data=callback_data("task", "del", t["id"], page))]
+
+def render_tasks(user_id, page=0):
+    now = user_now(user_id)
+    today = now.strftime("%Y-%m-%d")
+    # сегодня и остальные дни — три диапазона по индексу дат: сегодня, до сегодня и после
+    yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+    tomorrow = (now + timedelta(days=1)).strftime("%Y-%m-%d")
+    ranges = [(today, today), ("", yesterday), (tomorrow, "9999-12-31")]
+    counts = [storage.count_between("tasks", user_id, start, end) for start, end in ranges]
+    page, pages, slices = paginate(counts, page)
+    # часть -> (номер первого пункта на странице, записи страницы)
+    shown = {}
+    for part, offset, limit in slices:
+        first = offset + 1 + (counts[1] if part == 2 else 0)
+        shown[part] = (first, storage.records_between("tasks", user_id, *ranges[part], offset, limit))
+
+    lines = []
     kb = []
-    if today_tasks:
-        for i, t in enumerate(today_tasks, 1):
+    if 0 in shown:
+        lines.append("📋 Задачи на сегодня:")
+        first, today_tasks = shown[0]
+        for i, t in enumerate(today_tasks, first):
             status = "✅" if t.get("done") else "❌"
-            msg += f"{i}. {t.get('text','')} {status}\n"
-            if not t.get("done"):
-                kb.append([InlineKeyboardButton("✔ Выполнено", callback_data=f"task:today:done:{i-1}"),
-                           InlineKeyboardButton("❌ Удалить", callback_data=f"task:today:del:{i-1}")])
-            else:
-                # если задача уже выполнена — показываем только кнопку удаления
-                kb.append([InlineKeyboardButton("❌ Удалить", callback_data=f"task:today:del:{i-1}")])
-    else:
-        msg += "Нет задач на сегодня\n"
-
-    msg += "\n📋 Задачи на другие дни:\n"
-    if other_tasks:
-        for i, t in enumerate(other_tasks, 1):
-            status = "✅" if t.get("done") else "❌"
-            date_str = datetime.strptime(t.get("date"), "%Y-%m-%d").strftime("%d.%m.%Y")
-            msg += f"{i}. {t.get('text','')} ({date_str}) {status}\n"
-            if not t.get("done"):
-                kb.append([InlineKeyboardButton("✔ Выполнено", callback_data=f"task:other:done:{i-1}"),
-                           InlineKeyboardButton("❌ Удалить", callback_data=f"task:other:del:{i-1}")])
-            else:
-                kb.append([InlineKeyboardButton("❌ Удалить", callback_data=f"task:other:del:{i-1}")])
-    else:
-        msg += "Нет задач на другие дни\n"
+            lines.append(f"{i}. {clip(t.get('text',''))} {status}")
+            kb.append(task_buttons(t, page))
+    elif page == 0:
+        lines.append("📋 Задачи на сегодня:")
+        lines.append("Нет задач на сегодня")
+
+    if 1 in shown or 2 in shown:
+        lines.append("\n📋 Задачи на другие дни:" if lines else "📋 Задачи на другие дни:")
+        for part in (1, 2):
+            first, other_tasks = shown.get(part, (0, []))
+            for i, t in enumerate(other_tasks, first):
+                status = "✅" if t.get("done") else "❌"
+                lines.append(f"{i}. {clip(t.get('text',''))} ({ru_date(t.get('date'))}) {status}")
+                kb.append(task_buttons(t, page))
+    elif page == pages - 1:
+        lines.append("\n📋 Задачи на другие дни:")
+        lines.append("Нет задач на другие дни")
+    if pages > 1:
+        lines.append(f"\nСтраница {page + 1} из {pages}")
+    kb += page_buttons("task", page, pages)
+    return "\n".join(lines) + "\n", InlineKeyboardMarkup(kb) if kb else None
+
+async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+    user_id = get_user_id_from_update(update)
+    msg, markup = cached_render(user_id, f"tasks:{page}", lambda uid: render_tasks(uid, page))
 
     # Если есть inline-кнопки — отправляем/редактируем сообщение с inline-клавиатурой как раньше.
-    if kb:
-        await send_or_edit(update, msg, reply_markup=InlineKeyboardMarkup(kb))
+    if markup:
+        await send_or_edit(update, msg, reply_markup=markup)
         return
 
     # Если inline-кнопок нет — хотим показать сообщение с обычным меню один раз.
@@ -226,11 +704,11 @@ async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             # попробуем удалить исходное сообщение с inline-кнопками, чтобы избежать двойной выдачи
             await update.callback_query.message.delete()
-        except Exception:
+        except TelegramError:
             # если удалить нельзя — игнорируем и будем использовать send_or_edit как запасной вариант
             try:
                 await send_or_edit(update, msg, reply_markup=main_menu_keyboard())
-            except Exception:
+            except TelegramError:
                 # окончательный запасной вариант: попытка отправить в чат напрямую
                 if update.effective_chat:
                     await update.effective_chat.send_message(msg, reply_markup=main_menu_keyboard())
@@ -250,47 +728,26 @@ async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    data = query.data.split(":")  # e.g. task:today:done:0
-    if len(data) != 4:
-        await list_tasks(update, context)
-        return
-    _, group, action, idx_str = data
-    try:
-        idx = int(idx_str)
-    except:
-        await list_tasks(update, context)
-        return
-
+    data = parse_callback(query.data)  # task:done|del:<id>:<страница> или task:page:<страница>
     user_id = get_user_id_from_update(update)
-    user_tasks = tasks.get(user_id, [])
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_tasks = [t for t in user_tasks if t.get("date") == today]
-    other_tasks = [t for t in user_tasks if t.get("date") != today]
-
-    source = today_tasks if group == "today" else other_tasks
-    if idx < 0 or idx >= len(source):
-        await list_tasks(update, context)
+    if data and data[1:2] == ["page"]:
+        await list_tasks(update, context, callback_page(data, 2))
         return
-
-    entry = source[idx]
-    # find original index
-    orig_index = None
-    for oi, t in enumerate(user_tasks):
-        if t is entry or (t.get("text") == entry.get("text") and t.get("date") == entry.get("date")):
-            orig_index = oi
-            break
-    if orig_index is None:
-        await list_tasks(update, context)
+    page = callback_page(data, 3)
+    # кнопки старого формата (task:today:done:0), истёкший токен или уже удалённая задача —
+    # просто перерисуем список
+    entry = storage.get("tasks", user_id, data[2]) if data and len(data) >= 3 else None
+    if entry is None:
+        await list_tasks(update, context, page)
         return
+    action, task_id = data[1], data[2]
 
     if action == "done":
-        tasks[user_id][orig_index]["done"] = True
-        save_data(TASKS_FILE, tasks)
-        await list_tasks(update, context)
+        entry["done"] = True
+        storage.update("tasks", user_id, entry)
     elif action == "del":
-        tasks[user_id].pop(orig_index)
-        save_data(TASKS_FILE, tasks)
-        await list_tasks(update, context)
+        storage.delete("tasks", user_id, task_id)
+    await list_tasks(update, context, page)
 
 # ------------------- НАПОМИНАНИЯ -------------------
 async def add_reminder_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -325,7 +782,7 @@ async def add_reminder_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["rem_date"] = d.strftime("%Y-%m-%d")
         await send_or_edit(update, "Введите время в формате ЧЧ:ММ (например, 09:30):", reply_markup=ReplyKeyboardMarkup([["Отмена"]], resize_keyboard=True))
         return ASK_REM_TIME
-    except Exception:
+    except ValueError:
         await send_or_edit(update, "⚠ Неверный формат даты. Попробуйте ДД.MM.ГГГГ или нажмите Отмена.")
         return ASK_REM_DATE
 
@@ -337,99 +794,184 @@ async def add_reminder_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     time_str = update.message.text.strip()
     try:
         h, m = map(int, time_str.split(":"))
-        t_formatted = f"{h:02d}:{m:02d}"
-        reminder = {
-            "text": text,
-            "time": t_formatted,
-            "type": rtype,
-            "enabled": True,
-            "fired_today": False
-        }
-        if date_val:
-            reminder["date"] = date_val
-        reminders.setdefault(user_id, []).append(reminder)
-        save_data(REMINDERS_FILE, reminders)
-        await send_or_edit(update, f"✅ Напоминание добавлено: «{text}» в {t_formatted}", reply_markup=main_menu_keyboard())
-
-        context.user_data.pop("rem_text", None)
-        context.user_data.pop("rem_type", None)
-        context.user_data.pop("rem_date", None)
-        return ConversationHandler.END
-    except Exception:
+        dt_time(h, m)  # проверка диапазона часов и минут
+    except ValueError:
         await send_or_edit(update, "⚠ Неверный формат времени. Попробуйте ЧЧ:ММ или нажмите Отмена.")
         return ASK_REM_TIME
+    t_formatted = f"{h:02d}:{m:02d}"
+    reminder = {
+        "text": text,
+        "time": t_formatted,
+        "type": rtype,
+        "enabled": True,
+        "fired_today": False
+    }
+    if date_val:
+        reminder["date"] = date_val
+    reminder = storage.add("reminders", user_id, reminder)
+    index_reminder(user_id, reminder)
+    schedule_reminder(context.job_queue, user_id, reminder)
+    await send_or_edit(update, f"✅ Напоминание добавлено: «{text}» в {t_formatted}", reply_markup=main_menu_keyboard())
+
+    context.user_data.pop("rem_text", None)
+    context.user_data.pop("rem_type", None)
+    context.user_data.pop("rem_date", None)
+    return ConversationHandler.END
 
 async def reminder_checker(context: ContextTypes.DEFAULT_TYPE):
-    now_hm = datetime.now().strftime("%H:%M")
-    for user_id, rem_list in list(reminders.items()):
-        for rem in list(rem_list):
-            if rem.get("enabled") and rem.get("time") == now_hm and not rem.get("fired_today"):
-                try:
-                    await context.bot.send_message(int(user_id), f"🔔 Напоминание: {rem['text']}")
-                except Exception:
-                    pass
-                if rem.get("type") == "На сегодня":
-                    rem_list.remove(rem)
-                else:
-                    rem["fired_today"] = True
-        save_data(REMINDERS_FILE, reminders)
-
-async def list_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = get_user_id_from_update(update)
-    user_reminders = reminders.get(user_id, [])
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    today_rem = []
-    other_rem = []
-
-    for r in user_reminders:
-        if r.get("type") == "Ежедневно" or r.get("type") == "На сегодня":
-            today_rem.append(r)
-        else:
-            other_rem.append(r)
-
-    msg = "⏰ Напоминания:\n\n"
+    with reminder_tick_duration.time():
+        check_due_reminders(context)
+
+def check_due_reminders(context):
+    now_utc = datetime.now(timezone.utc)
+    # местное время считаем один раз на группу зон с одинаковым смещением,
+    # берём только корзины текущей минуты: ежедневные/на сегодня + датированные на сегодня
+    due = []
+    for offset, zones in offset_groups(now_utc).items():
+        now = now_utc + timedelta(minutes=offset)
+        now_hm, today = now.strftime("%H:%M"), now.strftime("%Y-%m-%d")
+        for zone in zones:
+            due += reminder_index.get((zone, now_hm), {}).values()
+            due += reminder_index.get((zone, f"{today} {now_hm}"), {}).values()
+    now_hm = now_utc.strftime("%H:%M UTC")
+    changed_users = set()
+    messages = []
+    for user_id, rem in due:
+        if not rem.get("enabled") or rem.get("fired_today"):
+            continue
+        messages.append((int(user_id), f"🔔 Напоминание: {rem['text']}"))
+        mark_reminder_fired(user_id, rem)
+        changed_users.add(user_id)
+    # изменения копятся в хранилище: JSON пишется один раз за окно, SQLite — только эти строки
+    if changed_users:
+        logger.info("Напоминания %s: сработало у %d пользователей", now_hm, len(changed_users))
+    # доставка идёт в фоне, чтобы долгая рассылка не задерживала следующий тик
+    reminders_due.inc(len(messages))
+    if messages:
+        context.application.create_task(deliver_reminders(context.bot, messages, f"Напоминания {now_hm}"))
+
+async def deliver_reminders(bot, messages, label):
+    results = await deliver_batch(bot, messages, label)
+    reminders_delivered.inc(sum(results))
+
+# ------------------- НАПОМИНАНИЯ ЧЕРЕЗ JOBQUEUE -------------------
+# rem["id"] -> Job; задачи не сохраняются, при старте пересоздаются из reminders.json
+reminder_jobs = {}
+
+async def fire_reminder(context: ContextTypes.DEFAULT_TYPE):
+    user_id, rem = context.job.data
+    if rem.get("type") != "Ежедневно":
+        reminder_jobs.pop(rem["id"], None)
+    # состояние меняем до отправки: пока идёт отправка, пользователь может удалить
+    # напоминание, и пометка после неё вернула бы удалённую запись (upsert в SQLite)
+    mark_reminder_fired(user_id, rem)
+    reminders_due.inc()
+    if await send_limited(context.bot, int(user_id), f"🔔 Напоминание: {rem['text']}"):
+        reminders_delivered.inc()
+
+def reminder_run_at(rem, tz=LOCAL_TZ, now=None):
+    """Ближайший момент срабатывания разового напоминания (aware datetime) в зоне tz или None"""
+    now = now or datetime.now(tz)
+    h, m = map(int, rem["time"].split(":"))
+    if rem.get("type") == "На другой день":
+        if rem.get("fired_today") or not rem.get("date"):
+            return None
+        d = datetime.strptime(rem["date"], "%Y-%m-%d").date()
+        # пропущенное во время простоя напоминание отправляем сразу
+        return max(datetime.combine(d, dt_time(h, m), tzinfo=tz), now)
+    # «На сегодня»: как и при опросе — ближайшее наступление этого времени
+    run_at = datetime.combine(now.date(), dt_time(h, m), tzinfo=tz)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+def schedule_reminder(job_queue, user_id, rem):
+    if REMINDER_MODE != "jobs" or job_queue is None or not rem.get("enabled", True):
+        return
+    cancel_reminder_job(rem)
+    name = f"rem:{user_id}"
+    if rem.get("type") == "Ежедневно":
+        h, m = map(int, rem["time"].split(":"))
+        job = job_queue.run_daily(fire_reminder, dt_time(h, m, tzinfo=user_tz(user_id)), data=(user_id, rem), name=name)
+    else:
+        run_at = reminder_run_at(rem, user_tz(user_id))
+        if run_at is None:
+            return
+        job = job_queue.run_once(fire_reminder, run_at, data=(user_id, rem), name=name)
+    reminder_jobs[rem["id"]] = job
+
+def cancel_reminder_job(rem):
+    job = reminder_jobs.pop(rem["id"], None)
+    if job is not None:
+        job.schedule_removal()
+
+def schedule_all_reminders(job_queue):
+    # при нескольких воркерах напоминание ставит только воркер его пользователя
+    for user_id, rem in storage.enabled_reminders():
+        if owns(user_id):
+            schedule_reminder(job_queue, user_id, rem)
+
+def reminder_buttons(r, page):
+    delete = InlineKeyboardButton("❌ Удалить", callback_data=callback_data("rem", "del", r["id"], page))
+    if r.get("type") != "Ежедневно":
+        return [delete]
+    if r.get("enabled", True):
+        return [InlineKeyboardButton("⏸ Остановить", callback_data=callback_data("rem", "stop", r["id"], page)), delete]
+    return [InlineKeyboardButton("▶ Возобновить", callback_data=callback_data("rem", "start", r["id"], page)), delete]
+
+def render_reminders(user_id, page=0):
+    # «Ежедневно» и «На сегодня» хранятся без даты (в индексе — дата ""), «На другой день» — с датой
+    ranges = [("", ""), ("0000-01-01", "9999-12-31")]
+    counts = [storage.count_between("reminders", user_id, start, end) for start, end in ranges]
+    page, pages, slices = paginate(counts, page)
+    shown = {part: (offset + 1, storage.records_between("reminders", user_id, *ranges[part], offset, limit))
+             for part, offset, limit in slices}
+
+    lines = ["⏰ Напоминания:\n"]
     kb = []
-
-    msg += "📅 На сегодня:\n"
-    if today_rem:
-        for i, r in enumerate(today_rem, 1):
+    if 0 in shown or page == 0:
+        lines.append("📅 На сегодня:")
+    if 0 in shown:
+        first, today_rem = shown[0]
+        for i, r in enumerate(today_rem, first):
             status = "✅" if r.get("fired_today") else "❌"
             type_note = "(ежедневно)" if r.get("type") == "Ежедневно" else ""
-            msg += f"{i}. {r.get('text','')} ({r.get('time','')} {type_note}) {status}\n"
-            if r.get("type") == "Ежедневно":
-                if r.get("enabled", True):
-                    kb.append([InlineKeyboardButton("⏸ Остановить", callback_data=f"rem:stop:{user_reminders.index(r)}"),
-                               InlineKeyboardButton("❌ Удалить", callback_data=f"rem:del:{user_reminders.index(r)}")])
-                else:
-                    kb.append([InlineKeyboardButton("▶ Возобновить", callback_data=f"rem:start:{user_reminders.index(r)}"),
-                               InlineKeyboardButton("❌ Удалить", callback_data=f"rem:del:{user_reminders.index(r)}")])
-            else:
-                kb.append([InlineKeyboardButton("❌ Удалить", callback_data=f"rem:del:{user_reminders.index(r)}")])
-    else:
-        msg += "Нет напоминаний на сегодня\n"
-
-    msg += "\n📅 На другие дни:\n"
-    if other_rem:
-        for i, r in enumerate(other_rem, 1):
+            lines.append(f"{i}. {clip(r.get('text',''))} ({r.get('time','')} {type_note}) {status}")
+            kb.append(reminder_buttons(r, page))
+    elif page == 0:
+        lines.append("Нет напоминаний на сегодня")
+
+    if 1 in shown or page == pages - 1:
+        lines.append("\n📅 На другие дни:")
+    if 1 in shown:
+        first, other_rem = shown[1]
+        for i, r in enumerate(other_rem, first):
             date_str = r.get("date", "?")
             status = "✅" if r.get("fired_today") else "❌"
-            msg += f"{i}. {r.get('text','')} ({date_str}, {r.get('time','')}) {status}\n"
-            kb.append([InlineKeyboardButton("❌ Удалить", callback_data=f"rem:del:{user_reminders.index(r)}")])
-    else:
-        msg += "Нет напоминаний на другие дни\n"
+            lines.append(f"{i}. {clip(r.get('text',''))} ({date_str}, {r.get('time','')}) {status}")
+            kb.append(reminder_buttons(r, page))
+    elif page == pages - 1:
+        lines.append("Нет напоминаний на другие дни")
+    if pages > 1:
+        lines.append(f"\nСтраница {page + 1} из {pages}")
+    kb += page_buttons("rem", page, pages)
+    return "\n".join(lines) + "\n", InlineKeyboardMarkup(kb) if kb else None
+
+async def list_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+    user_id = get_user_id_from_update(update)
+    msg, markup = cached_render(user_id, f"reminders:{page}", lambda uid: render_reminders(uid, page))
 
-    if kb:
-        await send_or_edit(update, msg, reply_markup=InlineKeyboardMarkup(kb))
+    if markup:
+        await send_or_edit(update, msg, reply_markup=markup)
         return
 
     if hasattr(update, "callback_query") and update.callback_query:
         try:
             await update.callback_query.message.delete()
-        except Exception:
+        except TelegramError:
             try:
                 await send_or_edit(update, msg, reply_markup=main_menu_keyboard())
-            except Exception:
+            except TelegramError:
                 if update.effective_chat:
                     await update.effective_chat.send_message(msg, reply_markup=main_menu_keyboard())
             return
@@ -444,56 +986,92 @@ async def list_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def rem_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    parts = query.data.split(":")
-    if len(parts) != 3:
-        await list_reminders(update, context)
-        return
-    _, action, idx_str = parts
-    try:
-        idx = int(idx_str)
-    except:
-        await list_reminders(update, context)
-        return
+    data = parse_callback(query.data)  # rem:stop|start|del:<id>:<страница> или rem:page:<страница>
     user_id = get_user_id_from_update(update)
-    rlist = reminders.get(user_id, [])
-    if idx < 0 or idx >= len(rlist):
-        await list_reminders(update, context)
+    if data and data[1:2] == ["page"]:
+        await list_reminders(update, context, callback_page(data, 2))
         return
+    page = callback_page(data, 3)
+    # старые кнопки с позицией (rem:del:3) сюда не попадут: такого id нет — перерисуем список
+    rem = storage.get("reminders", user_id, data[2]) if data and len(data) >= 3 else None
+    if rem is None:
+        await list_reminders(update, context, page)
+        return
+    action = data[1]
     if action == "stop":
-        rlist[idx]["enabled"] = False
+        unindex_reminder(user_id, rem)
+        cancel_reminder_job(rem)
+        rem["enabled"] = False
+        storage.update("reminders", user_id, rem)
     elif action == "start":
-        rlist[idx]["enabled"] = True
+        rem["enabled"] = True
+        # выключенных нет в индексе, и ежедневный сброс их не трогает: пометка могла остаться со дня выключения
+        if rem.get("type") == "Ежедневно":
+            rem["fired_today"] = False
+        storage.update("reminders", user_id, rem)
+        index_reminder(user_id, rem)
+        schedule_reminder(context.job_queue, user_id, rem)
     elif action == "del":
-        rlist.pop(idx)
-    save_data(REMINDERS_FILE, reminders)
-    await list_reminders(update, context)
+        unindex_reminder(user_id, rem)
+        cancel_reminder_job(rem)
+        storage.delete("reminders", user_id, rem["id"])
+    await list_reminders(update, context, page)
 
 # ------------------- РАНДОМ ФАЙЛЫ ----------------
-
-async def send_random_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    PDF_DIR = "pdfs"  # папка с файлами
-
-    if not os.path.exists(PDF_DIR):
-        await update.message.reply_text("⚠ Папка с PDF не найдена.", reply_markup=main_menu_keyboard())
+# Каталог уникальных PDF строится один раз (pdf_catalog.py) и читается при старте,
+# так что нажатие кнопки не трогает файловую систему, пока файл не нужно загружать.
+pdf_catalog = load_catalog()
+pdf_catalog_version = catalog_version(pdf_catalog)
+# sha256 -> file_id: после первой загрузки файл шлём по file_id (кэш — свой у каждого воркера)
+PDF_FILE_IDS_FILE = worker_file("pdf_file_ids.json")
+pdf_file_ids = load_data(PDF_FILE_IDS_FILE)
+# user_settings[user_id]["pdf_rotation"] = {"seed", "pos", "catalog"}: ротация без повторов
+# хранится как seed и позиция, сама перестановка вычисляется по месту (rotation_index).
+
+def remember_pdf_file_id(entry, message):
+    if message is None or message.document is None:
         return
+    pdf_file_ids[entry["sha256"]] = message.document.file_id
+    file_writer.mark_dirty(PDF_FILE_IDS_FILE, pdf_file_ids)
+
+def next_pdf_for_user(user_id):
+    """Каждый пользователь видит все документы по разу, прежде чем начнутся повторы"""
+    rot = user_settings.get(user_id, {}).get("pdf_rotation")
+    # новый круг — когда прошли весь каталог или каталог изменился (PDF добавили/удалили)
+    if rot is None or rot.get("catalog") != pdf_catalog_version or rot.get("pos", 0) >= len(pdf_catalog):
+        rot = {"seed": random.getrandbits(32), "pos": 0, "catalog": pdf_catalog_version}
+    entry = pdf_catalog[rotation_index(rot["seed"], rot["pos"], len(pdf_catalog))]
+    rot = dict(rot, pos=rot["pos"] + 1)
+    update_user_setting(user_id, "pdf_rotation", rot)
+    return entry
 
-    pdf_files = [f for f in os.listdir(PDF_DIR) if f.lower().endswith(".pdf")]
-    if not pdf_files:
+async def send_random_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not pdf_catalog:
         await update.message.reply_text("⚠ PDF файлов пока нет.", reply_markup=main_menu_keyboard())
         return
 
-    chosen_pdf = random.choice(pdf_files)
-    file_path = os.path.join(PDF_DIR, chosen_pdf)
+    entry = next_pdf_for_user(get_user_id_from_update(update))
 
     try:
+        file_id = pdf_file_ids.get(entry["sha256"])
+        if file_id:
+            try:
+                await context.bot.send_document(chat_id=update.effective_chat.id, document=file_id)
+                return
+            except BadRequest:
+                # file_id устарел (например, сменили бота) — загрузим файл заново
+                pdf_file_ids.pop(entry["sha256"], None)
+                file_writer.mark_dirty(PDF_FILE_IDS_FILE, pdf_file_ids)
         # открываем файл в бинарном режиме и передаём объект
-        with open(file_path, "rb") as f:
-            await context.bot.send_document(
+        with open(os.path.join(PDF_DIR, entry["file"]), "rb") as f:
+            message = await context.bot.send_document(
                 chat_id=update.effective_chat.id,
                 document=f,
-                filename=chosen_pdf
+                filename=entry["file"]
             )
-    except Exception as e:
+        remember_pdf_file_id(entry, message)
+    except (TelegramError, OSError) as e:
+        logger.warning("PDF %s в чат %s не отправлен: %s", entry["file"], update.effective_chat.id, e)
         await update.message.reply_text(
             f"⚠ Ошибка при отправке файла: {e}",
             reply_markup=main_menu_keyboard()
@@ -501,7 +1079,7 @@ async def send_random_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ------------------- СОБЫТИЯ -------------------
 async def events_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    kb = ReplyKeyboardMarkup([["🎂 День рождения", "📌 Ивент"], ["📅 Список событий", "Отмена"]], resize_keyboard=True)
+    kb = ReplyKeyboardMarkup([["🎂 День рождения", "📌 Ивент"], ["📅 Список событий", "⏭ Ближайшие 7 дней"], ["Отмена"]], resize_keyboard=True)
     await send_or_edit(update, "Выберите действие с событиями:", reply_markup=kb)
 
 # Добавление дня рождения
@@ -511,22 +1089,29 @@ async def start_add_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def receive_birthday_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["birthday_name"] = update.message.text.strip()
-    await send_or_edit(update, "✍ Теперь введите дату дня рождения в формате ДД.MM.ГГГГ (например, 26.09.2025,(год нынешний)):", reply_markup=ReplyKeyboardMarkup([["Отмена"]], resize_keyboard=True))
+    await send_or_edit(update, "✍ Теперь введите дату дня рождения в формате ДД.MM или ДД.MM.ГГГГ (например, 26.09 или 26.09.1990). Напомню о нём каждый год:", reply_markup=ReplyKeyboardMarkup([["Отмена"]], resize_keyboard=True))
     return BDAY_DATE
 
 async def receive_birthday_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = get_user_id_from_update(update)
     name = context.user_data.get("birthday_name")
+    text = update.message.text.strip()
     try:
-        d = datetime.strptime(update.message.text.strip(), "%d.%m.%Y").date()
-        birthdays.setdefault(user_id, []).append({"name": name, "date": d.strftime("%Y-%m-%d")})
-        save_data(BIRTHDAYS_FILE, birthdays)
-        await send_or_edit(update, f"✅ День рождения добавлен: {name} — {d.strftime('%d.%m.%Y')}", reply_markup=main_menu_keyboard())
-        context.user_data.pop("birthday_name", None)
-        return ConversationHandler.END
-    except Exception:
-        await send_or_edit(update, "⚠ Неверный формат. Попробуйте снова ДД.MM.ГГГГ или нажмите Отмена.")
+        if text.count(".") == 1:
+            # без года: проверяем по високосному году, чтобы 29.02 было допустимо
+            d = datetime.strptime(f"{text}.2000", "%d.%m.%Y").date()
+            date_str, shown = d.strftime("--%m-%d"), d.strftime("%d.%m")
+        else:
+            d = datetime.strptime(text, "%d.%m.%Y").date()
+            date_str, shown = d.strftime("%Y-%m-%d"), d.strftime("%d.%m.%Y")
+    except ValueError:
+        await send_or_edit(update, "⚠ Неверный формат. Попробуйте снова ДД.MM или ДД.MM.ГГГГ или нажмите Отмена.")
         return BDAY_DATE
+    record = storage.add("birthdays", user_id, {"name": name, "date": date_str})
+    event_calendar.add(user_id, "birthdays", record)
+    await send_or_edit(update, f"✅ День рождения добавлен: {name} — {shown}", reply_markup=main_menu_keyboard())
+    context.user_data.pop("birthday_name", None)
+    return ConversationHandler.END
 
 # Добавление ивента
 async def start_add_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -539,49 +1124,86 @@ async def receive_event_title(update: Update, context: ContextTypes.DEFAULT_TYPE
     return EVENT_DATE
 
 async def receive_event_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = get_user_id_from_update(update)
-    title = context.user_data.get("event_title")
     try:
         d = datetime.strptime(update.message.text.strip(), "%d.%m.%Y").date()
-        events.setdefault(user_id, []).append({"title": title, "date": d.strftime("%Y-%m-%d")})
-        save_data(EVENTS_FILE, events)
-        await send_or_edit(update, f"✅ Ивент добавлен: {title} — {d.strftime('%d.%m.%Y')}", reply_markup=main_menu_keyboard())
-        context.user_data.pop("event_title", None)
-        return ConversationHandler.END
-    except Exception:
+    except ValueError:
         await send_or_edit(update, "⚠ Неверный формат. Попробуйте снова ДД.MM.ГГГГ или нажмите Отмена.")
         return EVENT_DATE
+    context.user_data["event_date"] = d.strftime("%Y-%m-%d")
+    kb = ReplyKeyboardMarkup([["Не повторять", "Каждую неделю"], ["Каждый месяц", "Каждый год"], ["Отмена"]], resize_keyboard=True)
+    await send_or_edit(update, "🔁 Повторять событие?", reply_markup=kb)
+    return EVENT_REPEAT
+
+async def receive_event_repeat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    repeat = REPEAT_CHOICES.get(update.message.text.strip())
+    if repeat is None:
+        await send_or_edit(update, "⚠ Выберите вариант на клавиатуре или нажмите Отмена.")
+        return EVENT_REPEAT
+    user_id = get_user_id_from_update(update)
+    title = context.user_data.get("event_title")
+    date_str = context.user_data.get("event_date")
+    record = {"title": title, "date": date_str}
+    if repeat != REPEAT_NONE:
+        record["repeat"] = repeat
+    record = storage.add("events", user_id, record)
+    event_calendar.add(user_id, "events", record)
+    shown = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d.%m.%Y")
+    note = f" ({REPEAT_LABELS[repeat]})" if repeat in REPEAT_LABELS else ""
+    await send_or_edit(update, f"✅ Ивент добавлен: {title} — {shown}{note}", reply_markup=main_menu_keyboard())
+    context.user_data.pop("event_title", None)
+    context.user_data.pop("event_date", None)
+    return ConversationHandler.END
 
-async def build_events_list(user_id: str):
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    all_events = []
-
-    # we keep references to current indices in original lists
-    for i, b in enumerate(birthdays.get(user_id, [])):
-        all_events.append({"id": f"b{i}", "type": "birthday", "name": b["name"], "date": b["date"]})
-    for i, e in enumerate(events.get(user_id, [])):
-        all_events.append({"id": f"e{i}", "type": "event", "title": e["title"], "date": e["date"]})
-
-    if not all_events:
+def event_line(i, kind, record, occ, today):
+    """Строка события: для повторяющихся показываем ближайшую дату"""
+    note = " 🎉 Сегодня!" if occ == today else ""
+    if kind == "birthdays":
+        return f"{i}. 🎂 {clip(record['name'])} - {occ.strftime('%d.%m.%Y')}{note}"
+    repeat = REPEAT_LABELS.get(record.get("repeat"), "")
+    repeat = f" {repeat}" if repeat else ""
+    return f"{i}. 📌 {clip(record['title'])} - {occ.strftime('%d.%m.%Y')}{repeat}{note}"
+
+# вид записи в callback data событий: ev:del:<b|e>:<id>:<страница>
+EVENT_KIND_CODES = {"birthdays": "b", "events": "e"}
+EVENT_KINDS = {code: kind for kind, code in EVENT_KIND_CODES.items()}
+
+def render_events(user_id, page=0):
+    today = user_now(user_id).date()
+    # отсортированный список календарь держит до изменения событий — страница это срез
+    upcoming = event_calendar.upcoming(user_id, today)
+    if not upcoming:
         return "У вас нет событий.", None
-
-    all_events.sort(key=lambda x: x["date"])
+    page, pages, slices = paginate([len(upcoming)], page)
+    _, offset, limit = slices[0]
 
     msg_lines = []
     buttons = []
-    for i, ev in enumerate(all_events, 1):
-        dt = datetime.strptime(ev["date"], "%Y-%m-%d")
-        note = "🎉 Сегодня!" if ev["date"] == today_str else ""
-        if ev["type"] == "birthday":
-            msg_lines.append(f"{i}. 🎂 {ev['name']} - {dt.strftime('%d.%m.%Y')} {note}")
-            buttons.append([InlineKeyboardButton(f"❌ Удалить {ev['name']}", callback_data=f"del_{ev['id']}")])
-        else:
-            msg_lines.append(f"{i}. 📌 {ev['title']} - {dt.strftime('%d.%m.%Y')} {note}")
-            buttons.append([InlineKeyboardButton(f"❌ Удалить {ev['title']}", callback_data=f"del_{ev['id']}")])
+    for i, (occ, kind, record) in enumerate(upcoming[offset:offset + limit], offset + 1):
+        msg_lines.append(event_line(i, kind, record, occ, today))
+        label = clip(record["name"] if kind == "birthdays" else record["title"])
+        data = callback_data("ev", "del", EVENT_KIND_CODES[kind], record["id"], page)
+        buttons.append([InlineKeyboardButton(f"❌ Удалить {label}", callback_data=data)])
+    if pages > 1:
+        msg_lines.append(f"\nСтраница {page + 1} из {pages}")
+    buttons += page_buttons("ev", page, pages)
 
     text = "\n".join(msg_lines)
     return text, InlineKeyboardMarkup(buttons)
 
+async def build_events_list(user_id: str, page=0):
+    return cached_render(user_id, f"events:{page}", lambda uid: render_events(uid, page))
+
+async def upcoming_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = get_user_id_from_update(update)
+    today = user_now(user_id).date()
+    week = event_calendar.between(user_id, today, today + timedelta(days=6))
+    if week:
+        lines = [event_line(i, kind, record, occ, today) for i, (occ, kind, record) in enumerate(week, 1)]
+        text = "⏭ Ближайшие 7 дней:\n" + "\n".join(lines)
+    else:
+        text = "⏭ В ближайшие 7 дней событий нет."
+    await send_or_edit(update, text, reply_markup=main_menu_keyboard())
+
 async def list_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = get_user_id_from_update(update)
     text, kb = await build_events_list(user_id)
@@ -591,25 +1213,21 @@ async def delete_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = get_user_id_from_update(update)
-    # callback data format: del_b0 or del_e1
-    try:
-        _, ev_id = query.data.split("_", 1)
-    except Exception:
-        await list_events(update, context)
-        return
-    if ev_id.startswith("b"):
-        idx = int(ev_id[1:])
-        if user_id in birthdays and 0 <= idx < len(birthdays[user_id]):
-            birthdays[user_id].pop(idx)
-            save_data(BIRTHDAYS_FILE, birthdays)
-    elif ev_id.startswith("e"):
-        idx = int(ev_id[1:])
-        if user_id in events and 0 <= idx < len(events[user_id]):
-            events[user_id].pop(idx)
-            save_data(EVENTS_FILE, events)
+    # ev:del:<b|e>:<id>:<страница> или ev:page:<страница>; кнопки старого формата
+    # (del_b0 — позиция в списке) ничего не удаляют: позиция могла сместиться, просто перерисуем список
+    data = parse_callback(query.data)
+    if data and data[1:2] == ["page"]:
+        page = callback_page(data, 2)
+    else:
+        page = callback_page(data, 4)
+        kind = EVENT_KINDS.get(data[2]) if data and len(data) >= 4 and data[1] == "del" else None
+        if kind:
+            record = storage.delete(kind, user_id, data[3])
+            if record is not None:
+                event_calendar.remove(user_id, kind, record)
 
     # пересобираем и редактируем то же сообщение
-    text, kb = await build_events_list(user_id)
+    text, kb = await build_events_list(user_id, page)
     # edit original message; if no events left - edit text and then send main menu
     try:
         if kb:
@@ -623,95 +1241,287 @@ async def delete_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # fallback: отправим новое сообщение с меню
         try:
             await query.message.reply_text(text, reply_markup=kb or main_menu_keyboard())
-        except Exception:
-            pass
+        except TelegramError as e:
+            logger.warning("Список событий в чат %s не отправлен: %s", user_id, e)
+
+async def token_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    data = parse_callback(update.callback_query.data)
+    handler = CALLBACK_HANDLERS.get(data[0]) if data else None
+    if handler is None:
+        # токен истёк (например, после перезапуска) — кнопку уже не разобрать
+        await update.callback_query.answer("Кнопка устарела, откройте список заново")
+        return
+    await handler(update, context)
 
 # ------------------- МОЙ ДЕНЬ и МОЙ МЕСЯЦ -------------------
-async def my_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = get_user_id_from_update(update)
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_tasks = [t for t in tasks.get(user_id, []) if t.get("date") == today]
-    msg = "📅 Мой день\n\n📋 Задачи на сегодня:\n"
+def day_summary(user_id, day):
+    """Задачи и события пользователя на день — общая часть «Моего дня» и утренней сводки"""
+    day_str = day.strftime("%Y-%m-%d")
+    return storage.records_between("tasks", user_id, day_str, day_str), event_calendar.on(user_id, day)
+
+def format_day(today_tasks, today_events):
+    lines = ["📋 Задачи на сегодня:"]
     if today_tasks:
         for i, t in enumerate(today_tasks, 1):
             status = "✅" if t.get("done") else "❌"
-            msg += f"{i}. {t.get('text','')} {status}\n"
+            lines.append(f"{i}. {t.get('text','')} {status}")
     else:
-        msg += "Нет задач на сегодня\n"
-
-    msg += "\n🎉 События на сегодня:\n"
-    today_events = []
-    for b in birthdays.get(user_id, []):
-        if b.get("date") == today:
-            today_events.append(("birthday", b.get("name")))
-    for e in events.get(user_id, []):
-        if e.get("date") == today:
-            today_events.append(("event", e.get("title")))
+        lines.append("Нет задач на сегодня")
+
+    lines.append("\n🎉 События на сегодня:")
     if today_events:
-        for i, ev in enumerate(today_events, 1):
-            icon = "🎂" if ev[0] == "birthday" else "📌"
-            msg += f"{i}. {icon} {ev[1]}\n"
+        for i, (kind, record) in enumerate(today_events, 1):
+            if kind == "birthdays":
+                lines.append(f"{i}. 🎂 {record.get('name')}")
+            else:
+                lines.append(f"{i}. 📌 {record.get('title')}")
     else:
-        msg += "Нет событий на сегодня\n"
-    await send_or_edit(update, msg, reply_markup=main_menu_keyboard())
+        lines.append("Нет событий на сегодня")
+    return "\n".join(lines) + "\n"
 
-async def my_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def render_day(user_id):
+    return "📅 Мой день\n\n" + format_day(*day_summary(user_id, user_now(user_id).date())), None
+
+async def my_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = get_user_id_from_update(update)
-    month_prefix = datetime.now().strftime("%Y-%m")
-    msg = "📆 Мой месяц\n\n📋 Задачи на этот месяц:\n"
-    month_tasks = [t for t in tasks.get(user_id, []) if t.get("date","").startswith(month_prefix)]
+    msg, _ = cached_render(user_id, "day", render_day)
+    await send_or_edit(update, msg, reply_markup=main_menu_keyboard())
+
+def render_month(user_id):
+    month_prefix = user_now(user_id).strftime("%Y-%m")
+    month_start, month_end = f"{month_prefix}-01", f"{month_prefix}-31"
+    lines = ["📆 Мой месяц\n", "📋 Задачи на этот месяц:"]
+    month_tasks = storage.records_between("tasks", user_id, month_start, month_end)
     if month_tasks:
         for i, t in enumerate(month_tasks, 1):
-            date_str = datetime.strptime(t["date"], "%Y-%m-%d").strftime("%d.%m.%Y")
             status = "✅" if t.get("done") else "❌"
-            msg += f"{i}. {t.get('text','')} ({date_str}) {status}\n"
+            lines.append(f"{i}. {t.get('text','')} ({ru_date(t['date'])}) {status}")
     else:
-        msg += "Нет задач на этот месяц\n"
-
-    msg += "\n🎉 События на этот месяц:\n"
-    month_events = []
-    for b in birthdays.get(user_id, []):
-        if b.get("date","").startswith(month_prefix):
-            month_events.append(("birthday", b.get("name"), b.get("date")))
-    for e in events.get(user_id, []):
-        if e.get("date","").startswith(month_prefix):
-            month_events.append(("event", e.get("title"), e.get("date")))
-    month_events.sort(key=lambda x: x[2])
+        lines.append("Нет задач на этот месяц")
+
+    lines.append("\n🎉 События на этот месяц:")
+    today = user_now(user_id).date()
+    first_day = today.replace(day=1)
+    last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    month_events = event_calendar.between(user_id, first_day, last_day)
     if month_events:
-        for i, ev in enumerate(month_events, 1):
-            icon = "🎂" if ev[0]=="birthday" else "📌"
-            dt = datetime.strptime(ev[2], "%Y-%m-%d")
-            msg += f"{i}. {icon} {ev[1]} ({dt.strftime('%d.%m.%Y')})\n"
+        for i, (occ, kind, record) in enumerate(month_events, 1):
+            if kind == "birthdays":
+                lines.append(f"{i}. 🎂 {record.get('name')} ({ru_date(occ.isoformat())})")
+            else:
+                lines.append(f"{i}. 📌 {record.get('title')} ({ru_date(occ.isoformat())})")
     else:
-        msg += "Нет событий на этот месяц\n"
+        lines.append("Нет событий на этот месяц")
+    return "\n".join(lines) + "\n", None
+
+async def my_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = get_user_id_from_update(update)
+    msg, _ = cached_render(user_id, "month", render_month)
     await send_or_edit(update, msg, reply_markup=main_menu_keyboard())
 
 # ------------------- СБРОС / ЕЖЕДНЕВНЫЕ ЗАДАЧИ -------------------
-def schedule_daily_reset(app):
-    async def reset_tasks(context: ContextTypes.DEFAULT_TYPE):
-        # сохраняем историю задач в tasks_history, затем очищаем today's tasks
-        for user_id, user_tasks in list(tasks.items()):
-            if user_tasks:
-                tasks_history.setdefault(user_id, []).append({
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "tasks": user_tasks
-                })
-        save_data(TASKS_HISTORY_FILE, tasks_history)
-        # очищаем все задачи (user хотел сброс после 23:55). Если хочешь только пометить как прошлые — можно изменить.
-        tasks.clear()
-        save_data(TASKS_FILE, tasks)
-        # сброс fired_today у ежедневных напоминаний
-        for user_id, rem_list in reminders.items():
-            for rem in rem_list:
-                if rem.get("type") == "Ежедневно":
+RESET_TIME = "23:55"
+
+def rollover_tasks(up_to, zones=None):
+    """
+    Переносит в историю задачи с датой <= up_to и удаляет их; задачи на будущие дни остаются.
+    Пользователи берутся из индекса дат — тех, у кого ничего не наступило, не трогаем;
+    zones ограничивает перенос пользователями этих часовых поясов.
+    Повторный запуск безопасен: уже перенесённых задач в хранилище нет,
+    а повтор записи за тот же день журнал истории сливает по id задач.
+    Каждый воркер переносит только своих пользователей.
+    """
+    archived = 0
+    for user_id in storage.users_between("tasks", "", up_to):
+        if not owns(user_id) or zones is not None and not in_zones(user_id, zones):
+            continue
+        due = storage.records_between("tasks", user_id, "", up_to)
+        by_date = {}
+        for t in due:
+            by_date.setdefault(t.get("date") or up_to, []).append(t)
+        for day, day_tasks in by_date.items():
+            storage.append_history(user_id, {"date": day, "tasks": day_tasks})
+        for t in due:
+            storage.delete("tasks", user_id, t["id"])
+        archived += len(due)
+    return archived
+
+def reset_zones(zones, day):
+    """Ежедневный сброс для группы зон, у которых сейчас RESET_TIME"""
+    # в историю уходят задачи на сегодня и просроченные; «На другой день» остаются
+    archived = rollover_tasks(day.isoformat(), zones)
+    logger.info("Ежедневный сброс %s: в историю перенесено задач: %d", zones, archived)
+    # сброс fired_today у ежедневных напоминаний: только корзины этих зон в индексе;
+    # запись в индексе — та же, что в хранилище (JSON) или его копия (SQLite); mark_reminder_fired
+    # помечает именно её, поэтому её и проверяем и сохраняем
+    for zone in zones:
+        for key in list(reminder_zone_buckets.get(zone, ())):
+            for user_id, rem in list(reminder_index.get(key, {}).values()):
+                if rem.get("type") == "Ежедневно" and rem.get("fired_today") and owns(user_id):
                     rem["fired_today"] = False
-        save_data(REMINDERS_FILE, reminders)
+                    storage.update("reminders", user_id, rem)
+
+async def catch_up_rollover(context: ContextTypes.DEFAULT_TYPE):
+    # бот мог простоять ночь: догоняем сброс за прошедшие дни, сегодняшние задачи не трогаем
+    now_utc = datetime.now(timezone.utc)
+    for offset, zones in offset_groups(now_utc).items():
+        yesterday = (now_utc + timedelta(minutes=offset) - timedelta(days=1)).strftime("%Y-%m-%d")
+        archived = rollover_tasks(yesterday, zones)
+        if archived:
+            logger.info("Догоняющий сброс %s: в историю перенесено задач: %d", zones, archived)
+
+# ------------------- УТРЕННЯЯ СВОДКА -------------------
+# Состояние рассылки переживает перезапуск: {смещение: {"date", "last_user", "done"}}.
+# Пользователи обходятся в порядке user_id, поэтому продолжаем с места остановки.
+DIGEST_STATE_FILE = worker_file("digest_state.json")
+digest_state = load_data(DIGEST_STATE_FILE)
+digest_state_lock = asyncio.Lock()
+
+def digest_users(zones, day):
+    """
+    Кандидаты на сводку за day: задачи на этот день — по индексу дат хранилища,
+    дни рождения и ивенты — по индексу наступлений; записи остальных не читаются
+    """
+    day_str = day.isoformat()
+    users = set(storage.users_between("tasks", day_str, day_str)) | event_calendar.users_on(day)
+    return sorted(
+        u for u in users if owns(u) and user_settings.get(u, {}).get("digest", True) and in_zones(u, zones)
+    )
 
-    # Запланировать на 23:55 каждый день
-    try:
-        app.job_queue.run_daily(reset_tasks, dt_time(hour=23, minute=55))
-    except Exception:
-        pass
+def build_digest(user_id, day):
+    today_tasks, today_events = day_summary(user_id, day)
+    if not today_tasks and not today_events:
+        return None
+    return "☀ Доброе утро! Вот ваш день:\n\n" + format_day(today_tasks, today_events)
+
+async def save_digest_state(key, state):
+    async with digest_state_lock:
+        digest_state[key] = dict(state)
+        await save_data_async(DIGEST_STATE_FILE, digest_state)
+
+async def send_daily_digest(bot, offset, zones, today):
+    """Сводка для группы зон со смещением offset, у которых сейчас DIGEST_TIME"""
+    key = str(offset)
+    state = dict(digest_state.get(key, {}))
+    if state.get("date") != today.isoformat():
+        state = {"date": today.isoformat(), "last_user": "", "done": False}
+        # сразу отмечаем начало: если процесс упадёт до первой порции, resume_digests продолжит с начала
+        # (тик к тому времени уже пройдёт DIGEST_TIME)
+        await save_digest_state(key, state)
+    if state.get("done"):
+        return
+
+    # один проход: собираем сводки оставшихся кандидатов заранее
+    messages = []
+    for user_id in digest_users(zones, today):
+        if user_id <= state["last_user"]:
+            continue
+        text = build_digest(user_id, today)
+        if text:
+            messages.append((user_id, text))
+
+    # растягиваем рассылку на DIGEST_SPREAD_MINUTES: порция раз в минуту
+    chunks_count = max(1, min(DIGEST_SPREAD_MINUTES, len(messages)))
+    chunk_size = -(-len(messages) // chunks_count) if messages else 0
+    started = time.monotonic()
+    for i in range(chunks_count):
+        chunk = messages[i * chunk_size:(i + 1) * chunk_size]
+        if not chunk:
+            break
+        delay = started + i * 60 - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await deliver_batch(bot, [(int(u), text) for u, text in chunk], f"Утренняя сводка (UTC{offset:+d} мин)")
+        state["last_user"] = chunk[-1][0]
+        await save_digest_state(key, state)
+    state["done"] = True
+    await save_digest_state(key, state)
+
+async def toggle_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = get_user_id_from_update(update)
+    enabled = not user_settings.get(user_id, {}).get("digest", True)
+    update_user_setting(user_id, "digest", enabled)
+    if enabled:
+        await send_or_edit(update, f"🔔 Утренняя сводка включена (в {DIGEST_TIME} по вашему времени).", reply_markup=main_menu_keyboard())
+    else:
+        await send_or_edit(update, "🔕 Утренняя сводка выключена.", reply_markup=main_menu_keyboard())
+
+# ------------------- ПЛАНИРОВЩИК ПО ЧАСОВЫМ ПОЯСАМ -------------------
+# Один тик раз в ZONE_TICK_MINUTES вместо задач на каждого пользователя: для каждой группы зон
+# с одинаковым смещением считаем местное время и запускаем сброс/сводку, если оно совпало.
+# Смещения поясов кратны 15 минутам, поэтому RESET_TIME и DIGEST_TIME должны быть кратны 5 минутам
+# (main() проверяет это при запуске).
+ZONE_TICK_MINUTES = 5
+
+def zone_time_problems():
+    """Проверка RESET_TIME и DIGEST_TIME: с другим временем тик не совпадёт и сброс/сводка молча не запустятся"""
+    problems = []
+    for name, value in (("RESET_TIME", RESET_TIME), ("DIGEST_TIME", DIGEST_TIME)):
+        match = re.fullmatch(r"(\d{2}):(\d{2})", value)
+        if not match or int(match[1]) > 23 or int(match[2]) > 59:
+            problems.append(f"{name}={value!r}: нужно время в формате HH:MM")
+        elif int(match[2]) % ZONE_TICK_MINUTES:
+            problems.append(f"{name}={value}: минуты должны быть кратны {ZONE_TICK_MINUTES}")
+    return problems
+
+def zone_slot(now_utc):
+    """Время тика, округлённое до ZONE_TICK_MINUTES: опоздание тика не сдвигает совпадение"""
+    slot = now_utc + timedelta(minutes=ZONE_TICK_MINUTES / 2)
+    return slot.replace(minute=slot.minute - slot.minute % ZONE_TICK_MINUTES, second=0, microsecond=0)
+
+async def zone_tick(context: ContextTypes.DEFAULT_TYPE):
+    slot = zone_slot(datetime.now(timezone.utc))
+    for offset, zones in offset_groups(slot).items():
+        local = slot + timedelta(minutes=offset)
+        local_hm = local.strftime("%H:%M")
+        if local_hm == RESET_TIME:
+            reset_zones(zones, local.date())
+        if local_hm == DIGEST_TIME:
+            context.application.create_task(send_daily_digest(context.bot, offset, zones, local.date()))
+
+async def resume_digests(context: ContextTypes.DEFAULT_TYPE):
+    # если бот перезапустился посреди сегодняшней рассылки — продолжаем её
+    now_utc = datetime.now(timezone.utc)
+    for offset, zones in offset_groups(now_utc).items():
+        today = (now_utc + timedelta(minutes=offset)).date()
+        state = digest_state.get(str(offset), {})
+        if state.get("date") == today.isoformat() and not state.get("done"):
+            context.application.create_task(send_daily_digest(context.bot, offset, zones, today))
+
+def schedule_zone_jobs(app):
+    now_utc = datetime.now(timezone.utc)
+    first = zone_slot(now_utc + timedelta(minutes=ZONE_TICK_MINUTES / 2)) - now_utc
+    if app.job_queue is None:
+        logger.warning("JobQueue недоступна (нужен python-telegram-bot[job-queue]): сброс и сводка отключены")
+        return
+    app.job_queue.run_repeating(zone_tick, interval=ZONE_TICK_MINUTES * 60, first=first, name="zone_tick")
+    app.job_queue.run_once(catch_up_rollover, 1, name="rollover_catch_up")
+    app.job_queue.run_once(resume_digests, 5, name="digest_resume")
+
+async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/tz Europe/Moscow или /tz +3 — часовой пояс пользователя; /tz без аргумента — текущий"""
+    user_id = get_user_id_from_update(update)
+    if not context.args:
+        current = zone_of(user_id) or f"время сервера (UTC{user_now(user_id).strftime('%z')})"
+        await send_or_edit(update, f"🕒 Ваш часовой пояс: {current}.\nИзменить: /tz Europe/Moscow или /tz +3", reply_markup=main_menu_keyboard())
+        return
+    parsed = parse_tz(" ".join(context.args))
+    if parsed is None:
+        await send_or_edit(update, "⚠ Не знаю такой часовой пояс. Пример: /tz Europe/Moscow, /tz +3 или /tz +5:30 (минуты — 00, 15, 30 или 45)", reply_markup=main_menu_keyboard())
+        return
+    name, tz = parsed
+    reminders = [r for r in storage.user_records("reminders", user_id) if r.get("enabled", True)]
+    for rem in reminders:
+        unindex_reminder(user_id, rem)
+    tz_users.get(zone_of(user_id), set()).discard(user_id)
+    tz_cache[name] = tz
+    tz_users.setdefault(name, set()).add(user_id)
+    update_user_setting(user_id, "tz", name)
+    # напоминания пользователя переезжают в корзины и задачи новой зоны
+    for rem in reminders:
+        index_reminder(user_id, rem)
+        schedule_reminder(context.job_queue, user_id, rem)
+    await send_or_edit(update, f"🕒 Часовой пояс: {name}. Сейчас у вас {user_now(user_id).strftime('%H:%M')}.", reply_markup=main_menu_keyboard())
 
 # ------------------- CANCEL -------------------
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -726,8 +1536,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # обязательно ответим на callback_query, чтобы клиент не оставил его в подвешенном состоянии
         try:
             await cq.answer()
-        except Exception:
-            pass
+        except TelegramError as e:
+            logger.warning("cancel: callback не подтверждён: %s", e)
 
         # попробуем отредактировать исходное сообщение (удалить inline-кнопки)
         try:
@@ -736,31 +1546,31 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # если редактирование не прошло — отправим простой reply
             try:
                 await cq.message.reply_text("❌ Отменено.")
-            except Exception:
-                pass
+            except TelegramError as e:
+                logger.warning("cancel: ответ не отправлен: %s", e)
 
         # отправим главное меню обычным сообщением (ReplyKeyboardMarkup)
         try:
             await cq.message.reply_text("Возвращаю в главное меню.", reply_markup=main_menu_keyboard())
-        except Exception:
+        except TelegramError:
             try:
                 if update.effective_chat:
                     await update.effective_chat.send_message("Возвращаю в главное меню.", reply_markup=main_menu_keyboard())
-            except Exception:
-                pass
+            except TelegramError as e:
+                logger.warning("cancel: меню не отправлено: %s", e)
 
     # если это обычное текстовое сообщение (например, пользователь ввёл Отмена)
     elif update.message:
         try:
             await update.message.reply_text("❌ Отменено.", reply_markup=main_menu_keyboard())
-        except Exception:
-            pass
+        except TelegramError as e:
+            logger.warning("cancel: ответ не отправлен: %s", e)
 
     # УДАЛИТЕ context.user_data.clear() — вместо этого аккуратно удаляем только те ключи, что мы сами создавали
     for k in (
         "task_day_type", "task_other_date",
         "rem_text", "rem_type", "rem_date",
-        "birthday_name", "event_title"
+        "birthday_name", "event_title", "event_date"
     ):
         context.user_data.pop(k, None)
 
@@ -768,19 +1578,122 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ------------------- РЕГИСТРАЦИЯ ХЕНДЛЕРОВ И ЗАПУСК -------------------
-def main():
-    # Загружаем данные
-    global tasks, reminders, birthdays, events, tasks_history
-    tasks = load_data(TASKS_FILE)
-    reminders = load_data(REMINDERS_FILE)
-    birthdays = load_data(BIRTHDAYS_FILE)
-    events = load_data(EVENTS_FILE)
-    tasks_history = load_data(TASKS_HISTORY_FILE)
+# вид из callback data -> хендлер (для кнопок, пришедших токеном)
+CALLBACK_HANDLERS = {"task": task_callback, "rem": rem_callback, "ev": delete_event}
+
+async def flush_on_shutdown(app):
+    await storage.close()
+    await file_writer.close()
+
+def health_check(app):
+    """Состояние для /healthz: планировщик запущен, тик часовых поясов стоит в очереди, хранилище отвечает"""
+    storage_ok, storage_details = storage.health()
+    scheduler = app.job_queue.scheduler if app.job_queue else None
+    tick = app.job_queue.get_jobs_by_name("zone_tick") if app.job_queue else ()
+    jobs_ok = bool(scheduler and scheduler.running and tick and tick[0].next_t)
+    details = {
+        "mode": BOT_MODE,
+        "job_queue": {
+            "ok": jobs_ok,
+            "jobs": len(app.job_queue.jobs()) if app.job_queue else 0,
+            "next_tick": tick[0].next_t.isoformat() if tick and tick[0].next_t else None,
+        },
+        "storage": dict(storage_details, ok=storage_ok),
+        "update_queue": pending_updates(app),
+    }
+    return jobs_ok and storage_ok, details
+
+# при WORKER_COUNT > 1 апдейты чужих пользователей пересылаются воркеру-владельцу
+update_forwarder = UpdateForwarder(WEBHOOK_PATH, WEBHOOK_SECRET)
+
+async def forward_if_foreign(update, retrying=False):
+    """True, если апдейт принадлежит другому воркеру: переслан ему (или, после повторов, потерян)"""
+    key = update_user_key(update)
+    if key is None or owns(key):
+        return False
+    if retrying:
+        await update_forwarder.forward_retrying(update.to_dict(), partition(key))
+    else:
+        await update_forwarder.forward(update.to_dict(), partition(key))
+    return True
+
+async def route_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # апдейты из polling (его ведёт воркер 0): чужие пересылаем и дальше не обрабатываем.
+    # getUpdates их уже подтвердил, Telegram не повторит — повторяем пересылку сами, по очереди,
+    # чтобы следующие апдейты того же пользователя не обогнали этот (доставка — не более одного раза)
+    if await forward_if_foreign(update, retrying=True):
+        raise ApplicationHandlerStop
 
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+async def serve(app, webhook):
+    """
+    Вебхук в том же процессе: aiohttp из webserver.py принимает POST от Telegram,
+    проверяет секрет и кладёт апдейт в очередь PTB. Рядом отвечают "/", "/healthz" и "/metrics";
+    при polling сервер тоже поднимается — ради них. При нескольких воркерах вебхук (или polling) у Telegram регистрирует только воркер 0,
+    остальные принимают на том же пути апдейты, пересланные им по WORKER_URLS.
+    """
+    async def feed(data):
+        update = Update.de_json(data, app.bot)
+        # чужой апдейт пересылаем до ответа Telegram: если владелец недоступен,
+        # вебхук ответит ошибкой и Telegram повторит доставку
+        if not await forward_if_foreign(update):
+            await app.update_queue.put(update)
+
+    webserver.mount_webhook(webserver.app, WEBHOOK_PATH, WEBHOOK_SECRET, feed)
+    webserver.mount_health(webserver.app, lambda: health_check(app))
+    webserver.mount_metrics(webserver.app, metrics.render)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with app:
+        if webhook and WORKER_ID == 0:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        elif app.updater is not None:
+            await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await app.start()
+        runner = await webserver.start_site(webserver.app, PORT)
+        print(f"Бот запущен ({'вебхук' if webhook else 'polling'}, воркер {WORKER_ID}/{WORKER_COUNT}, порт {PORT})...")
+        try:
+            await stop.wait()
+        finally:
+            if app.updater is not None and app.updater.running:
+                await app.updater.stop()
+            await runner.cleanup()
+            await app.stop()
+            await update_forwarder.close()
+            # post_shutdown вызывают только run_polling/run_webhook — сбрасываем данные сами
+            await flush_on_shutdown(app)
+
+
+def build_application(webhook=False, base_url=BOT_API_URL, concurrent_updates=CONCURRENT_UPDATES):
+    """Application со всеми хендлерами и планировщиками; base_url — для тестового Bot API"""
+    builder = ApplicationBuilder().token(TELEGRAM_TOKEN).post_shutdown(flush_on_shutdown)
+    # тот же пул, что ApplicationBuilder создаёт по умолчанию, плюс счётчики запросов и ошибок
+    builder = builder.request(InstrumentedRequest(connection_pool_size=256))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if webhook:
+        # апдейты приходят через webserver.py, Updater (long polling) не нужен
+        builder = builder.updater(None)
+    if concurrent_updates > 1:
+        # разные пользователи — параллельно, один пользователь — по порядку (см. user_updates.py)
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+    app = builder.build()
+
+    if WORKER_COUNT > 1:
+        # раньше всех хендлеров: чужие апдейты уходят своему воркеру
+        app.add_handler(TypeHandler(Update, route_update), group=-1)
 
     # Команда /start
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("digest", toggle_digest))
+    app.add_handler(CommandHandler("tz", set_timezone))
 
     # Tasks conversation
     task_conv = ConversationHandler(
@@ -865,6 +1778,10 @@ def main():
                 MessageHandler(filters.Regex("^Отмена$"), cancel),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, receive_event_date)
             ],
+            EVENT_REPEAT: [
+                MessageHandler(filters.Regex("^Отмена$"), cancel),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_event_repeat)
+            ],
         },
         fallbacks=[MessageHandler(filters.Regex("^Отмена$"), cancel)],
         per_message=False
@@ -876,7 +1793,10 @@ def main():
 
     # List / delete events
     app.add_handler(MessageHandler(filters.Regex("^📅 Список событий$"), list_events))
-    app.add_handler(CallbackQueryHandler(delete_event, pattern="^del_"))
+    app.add_handler(MessageHandler(filters.Regex("^⏭ Ближайшие 7 дней$"), upcoming_events))
+    app.add_handler(CallbackQueryHandler(delete_event, pattern="^(ev:|del_)"))
+    # кнопки с длинными данными приходят токеном — разрешаем и передаём хендлеру по виду
+    app.add_handler(CallbackQueryHandler(token_callback, pattern=f"^{TOKEN_PREFIX}"))
 
     # Day / Month
     app.add_handler(MessageHandler(filters.Regex("^📅 Мой день$"), my_day))
@@ -890,17 +1810,45 @@ def main():
     app.add_handler(MessageHandler(filters.Regex("^Отмена$"), cancel))
     # ----------------------
 
-    # Планировщик: проверки напоминаний каждую минуту
-    try:
+    for group_handlers in app.handlers.values():
+        instrument_handlers(group_handlers)
+    update_queue_size.set_function(lambda: pending_updates(app))
+
+    # Планировщик напоминаний: своя задача на каждое напоминание или опрос раз в минуту
+    if app.job_queue is None:
+        logger.warning("JobQueue недоступна (нужен python-telegram-bot[job-queue]): напоминания отключены")
+    elif REMINDER_MODE == "jobs":
+        schedule_all_reminders(app.job_queue)
+    else:
         app.job_queue.run_repeating(reminder_checker, interval=60, first=5)
-    except Exception:
-        pass
 
-    # Планировщик: ежедневный сброс (23:55)
-    schedule_daily_reset(app)
+    # Планировщик: ежедневный сброс (23:55) и утренняя сводка — по группам часовых поясов
+    schedule_zone_jobs(app)
+    return app
+
+def main():
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+
+    webhook = BOT_MODE == "webhook" and bool(WEBHOOK_URL)
+    if BOT_MODE == "webhook" and not webhook:
+        logger.warning("BOT_MODE=webhook, но WEBHOOK_URL не задан — работаем через polling")
+    problems = zone_time_problems()
+    if problems:
+        raise SystemExit("Неверная настройка времени:\n" + "\n".join(problems))
+    if WORKER_COUNT > 1:
+        problems = check_config(STORAGE_BACKEND, os.getenv("WEBHOOK_SECRET"))
+        if problems:
+            raise SystemExit("Неверная настройка воркеров:\n" + "\n".join(problems))
+        # long polling ведёт только воркер 0, остальные получают апдейты пересылкой
+        app = build_application(webhook or WORKER_ID != 0)
+        asyncio.run(serve(app, webhook))
+        return
 
-    print("Бот запущен...")
-    app.run_polling()
+    # и при polling поднимаем webserver.py: на нём /healthz и /metrics
+    app = build_application(webhook)
+    asyncio.run(serve(app, webhook))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+# callbacks.py
+import time
+import base64
+import hashlib
+from collections import OrderedDict
+
+# ------------------- ФОРМАТ CALLBACK DATA -------------------
+# Кнопка несёт "<вид>:<действие>:<id записи>[:...]": id стабилен, поэтому кнопки старых
+# сообщений после удалений указывают на ту же запись (или ни на какую), а не на соседнюю.
+# Telegram ограничивает callback_data 64 байтами; строка длиннее заменяется токеном "~xxxxxxxx",
+# а сама хранится в памяти процесса (ограниченно по размеру и по времени).
+CALLBACK_DATA_LIMIT = 64
+TOKEN_PREFIX = "~"
+TOKEN_TTL = 7 * 24 * 3600
+TOKEN_LIMIT = 50_000
+
+class CallbackTokens:
+    """Токен -> исходная строка callback_data; самые старые вытесняются, просроченные не разрешаются"""
+
+    def __init__(self, limit=TOKEN_LIMIT, ttl=TOKEN_TTL):
+        self.limit = limit
+        self.ttl = ttl
+        self.data = OrderedDict()
+
+    @staticmethod
+    def token_for(payload):
+        # токен — хеш строки: повторная отрисовка той же кнопки не плодит новые записи
+        digest = hashlib.blake2b(payload.encode(), digest_size=6).digest()
+        return base64.urlsafe_b64encode(digest).decode()
+
+    def put(self, payload):
+        token = self.token_for(payload)
+        self.data[token] = (payload, time.monotonic() + self.ttl)
+        self.data.move_to_end(token)
+        while len(self.data) > self.limit:
+            self.data.popitem(last=False)
+        return token
+
+    def resolve(self, token):
+        entry = self.data.get(token)
+        if entry is None:
+            return None
+        payload, expires = entry
+        if expires < time.monotonic():
+            del self.data[token]
+            return None
+        return payload
+
+callback_tokens = CallbackTokens()
+
+def callback_data(*parts):
+    data = ":".join(str(part) for part in parts)
+    if len(data.encode()) <= CALLBACK_DATA_LIMIT:
+        return data
+    return TOKEN_PREFIX + callback_tokens.put(data)
+
+def parse_callback(data):
+    """callback_data -> [вид, действие, ...]; None, если токен неизвестен или истёк"""
+    if data.startswith(TOKEN_PREFIX):
+        data = callback_tokens.resolve(data[len(TOKEN_PREFIX):])
+        if data is None:
+            return None
+    return data.split(":")
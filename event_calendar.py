@@ -0,0 +1,204 @@
+# event_calendar.py
+import os
+import calendar
+from collections import OrderedDict
+from datetime import date, timedelta
+
+# ------------------- ПРАВИЛА ПОВТОРА -------------------
+# Дни рождения повторяются каждый год всегда, у ивентов правило хранится в поле "repeat".
+REPEAT_NONE, REPEAT_WEEKLY, REPEAT_MONTHLY, REPEAT_YEARLY = "none", "weekly", "monthly", "yearly"
+
+REPEAT_CHOICES = {
+    "Не повторять": REPEAT_NONE,
+    "Каждую неделю": REPEAT_WEEKLY,
+    "Каждый месяц": REPEAT_MONTHLY,
+    "Каждый год": REPEAT_YEARLY,
+}
+REPEAT_LABELS = {
+    REPEAT_WEEKLY: "🔁 еженедельно",
+    REPEAT_MONTHLY: "🔁 ежемесячно",
+    REPEAT_YEARLY: "🔁 ежегодно",
+}
+
+def record_repeat(kind, record):
+    if kind == "birthdays":
+        return REPEAT_YEARLY
+    return record.get("repeat", REPEAT_NONE)
+
+def rule_key(kind, record):
+    """
+    Ключ корзины индекса. Дата хранится как "YYYY-MM-DD" или "--MM-DD" (день рождения без года),
+    разбираем её один раз при индексации, а не при каждом показе.
+    """
+    raw = record.get("date", "")
+    month, day = int(raw[-5:-3]), int(raw[-2:])
+    repeat = record_repeat(kind, record)
+    if repeat == REPEAT_YEARLY:
+        return ("y", month, day)
+    if repeat == REPEAT_MONTHLY:
+        return ("m", day)
+    if repeat == REPEAT_WEEKLY:
+        return ("w", date.fromisoformat(raw).weekday())
+    return ("d", raw)
+
+def day_keys(day):
+    """Все ключи корзин, которые срабатывают в этот день"""
+    keys = [("y", day.month, day.day), ("m", day.day), ("w", day.weekday()), ("d", day.isoformat())]
+    # 29 февраля в невисокосный год отмечаем 28-го
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        keys.append(("y", 2, 29))
+    # «каждый месяц 31-го» в коротком месяце — в последний день месяца
+    last_day = calendar.monthrange(day.year, day.month)[1]
+    if day.day == last_day:
+        keys.extend(("m", d) for d in range(last_day + 1, 32))
+    return keys
+
+def clamp_day(year, month, day):
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(key, today):
+    """Ближайшее наступление (сегодня или позже); для разовых — сама дата, даже прошедшая"""
+    if key[0] == "y":
+        occ = clamp_day(today.year, key[1], key[2])
+        return occ if occ >= today else clamp_day(today.year + 1, key[1], key[2])
+    if key[0] == "m":
+        occ = clamp_day(today.year, today.month, key[1])
+        if occ >= today:
+            return occ
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        return clamp_day(year, month, key[1])
+    if key[0] == "w":
+        return today + timedelta(days=(key[1] - today.weekday()) % 7)
+    return date.fromisoformat(key[1])
+
+# ------------------- ИНДЕКС НАСТУПЛЕНИЙ -------------------
+# сколько пользователей держать с построенными корзинами (давно не нужные вытесняются)
+CALENDAR_MAX_USERS = int(os.getenv("CALENDAR_MAX_USERS", "10000"))
+
+class EventCalendar:
+    """
+    Для каждого пользователя — корзины {ключ правила: {id: (kind, запись)}}.
+    Индекс строится при первом обращении к пользователю и дальше обновляется
+    через add()/remove(); запрос «на день» — несколько обращений к словарю,
+    «на период» — по одному такому запросу на каждый день периода.
+    Отсортированный список ближайших наступлений запоминается на день до изменения
+    событий пользователя, так что листание страниц его не пересчитывает.
+    Отдельно — общий счётчик ключей правил по всем пользователям (occurrences): по нему
+    users_on(day) отвечает, у кого в этот день что-то есть, не строя корзины каждого.
+    """
+
+    KINDS = ("birthdays", "events")
+
+    def __init__(self, storage, max_users=CALENDAR_MAX_USERS):
+        self.storage = storage
+        self.max_users = max_users
+        self.users = OrderedDict()
+        # ключ правила -> {user_id: число записей}; строится при первом users_on()
+        self.occurrences = None
+        # user_id -> (today, [(дата, kind, запись)])
+        self.upcoming_cache = {}
+        # хранилище, которое выгружает пользователей из памяти (UserShardStorage), сообщает об этом
+        listeners = getattr(storage, "eviction_listeners", None)
+        if listeners is not None:
+            listeners.append(self.forget)
+
+    def _user(self, user_id):
+        buckets = self.users.get(user_id)
+        if buckets is not None:
+            self.users.move_to_end(user_id)
+            return buckets
+        buckets = {}
+        for kind in self.KINDS:
+            for record in self.storage.user_records(kind, user_id):
+                buckets.setdefault(rule_key(kind, record), {})[record["id"]] = (kind, record)
+        self.users[user_id] = buckets
+        while len(self.users) > self.max_users:
+            evicted, _ = self.users.popitem(last=False)
+            self.upcoming_cache.pop(evicted, None)
+        return buckets
+
+    def _count(self, key, user_id, delta):
+        counts = self.occurrences.setdefault(key, {})
+        counts[user_id] = counts.get(user_id, 0) + delta
+        if counts[user_id] <= 0:
+            del counts[user_id]
+            if not counts:
+                del self.occurrences[key]
+
+    def users_on(self, day):
+        """Пользователи, у которых в этот день может быть день рождения или ивент"""
+        if self.occurrences is None:
+            self.occurrences = {}
+            for kind in self.KINDS:
+                for user_id, raw, repeat, count in self.storage.event_rules(kind):
+                    record = {"date": raw} if repeat is None else {"date": raw, "repeat": repeat}
+                    self._count(rule_key(kind, record), user_id, count)
+        found = set()
+        for key in day_keys(day):
+            found.update(self.occurrences.get(key, ()))
+        # повторы ивента, начинающиеся позже day, отсеет on() — здесь лишь кандидаты
+        return found
+
+    def forget(self, user_id):
+        self.users.pop(user_id, None)
+        self.upcoming_cache.pop(user_id, None)
+
+    def add(self, user_id, kind, record):
+        self.upcoming_cache.pop(user_id, None)
+        if self.occurrences is not None:
+            self._count(rule_key(kind, record), user_id, 1)
+        if user_id in self.users:
+            self.users[user_id].setdefault(rule_key(kind, record), {})[record["id"]] = (kind, record)
+
+    def remove(self, user_id, kind, record):
+        self.upcoming_cache.pop(user_id, None)
+        if self.occurrences is not None:
+            self._count(rule_key(kind, record), user_id, -1)
+        buckets = self.users.get(user_id)
+        if buckets is None:
+            return
+        key = rule_key(kind, record)
+        bucket = buckets.get(key, {})
+        bucket.pop(record["id"], None)
+        if not bucket:
+            buckets.pop(key, None)
+
+    def on(self, user_id, day):
+        """[(kind, запись)] на конкретный день"""
+        buckets = self._user(user_id)
+        day_str = day.isoformat()
+        found = []
+        for key in day_keys(day):
+            for kind, record in buckets.get(key, {}).values():
+                # повторы ивента начинаются с его даты; у дней рождения дата — это год рождения
+                if kind == "events" and record.get("date", "") > day_str:
+                    continue
+                found.append((kind, record))
+        return found
+
+    def between(self, user_id, start, end):
+        """[(дата, kind, запись)] для start <= дата <= end, по возрастанию даты"""
+        found = []
+        day = start
+        while day <= end:
+            found.extend((day, kind, record) for kind, record in self.on(user_id, day))
+            day += timedelta(days=1)
+        return found
+
+    def upcoming(self, user_id, today):
+        """Все события пользователя с ближайшей датой наступления, по возрастанию"""
+        cached = self.upcoming_cache.get(user_id)
+        if cached is not None and cached[0] == today:
+            return cached[1]
+        found = []
+        today_str = today.isoformat()
+        for key, bucket in self._user(user_id).items():
+            occ = next_occurrence(key, today)
+            for kind, record in bucket.values():
+                if kind == "events" and record.get("date", "") > today_str:
+                    found.append((next_occurrence(key, date.fromisoformat(record["date"])), kind, record))
+                else:
+                    found.append((occ, kind, record))
+        found.sort(key=lambda item: item[0])
+        self.upcoming_cache[user_id] = (today, found)
+        return found
@@ -0,0 +1,199 @@
+# history_log.py
+import os
+import sys
+import json
+import calendar
+from datetime import datetime
+
+# ------------------- НАСТРОЙКИ -------------------
+# История задач: по файлу JSON Lines на месяц, tasks_history/YYYY-MM.jsonl.
+# Строка — {"user_id": ..., "date": "YYYY-MM-DD", "tasks": [...]}, user_id всегда первым,
+# чтобы чтение по одному пользователю отсеивало чужие строки без json.loads.
+HISTORY_DIR = os.getenv("HISTORY_DIR", "tasks_history")
+SHARD_SUFFIX = ".jsonl"
+SUMMARY_SUFFIX = ".summary.json"
+
+def entry_line(user_id, entry):
+    record = {"user_id": user_id}
+    record.update((k, v) for k, v in entry.items() if k != "user_id")
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def user_prefix(user_id):
+    return entry_line(user_id, {})[:-2]
+
+def entry_stats(entry):
+    tasks = entry.get("tasks", [])
+    return {"days": 1, "tasks": len(tasks), "done": sum(1 for t in tasks if t.get("done"))}
+
+def task_key(task):
+    return task.get("id") or json.dumps(task, ensure_ascii=False, sort_keys=True)
+
+def merge_entries(old, new):
+    """
+    Две записи одного пользователя за один день (повторный или догоняющий запуск
+    архивации) — объединяем задачи по id, более поздняя версия задачи побеждает
+    """
+    if old is None:
+        return new
+    tasks = {task_key(t): t for t in old.get("tasks", [])}
+    tasks.update((task_key(t), t) for t in new.get("tasks", []))
+    return dict(old, **new, tasks=list(tasks.values()))
+
+def month_end(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{month}-{calendar.monthrange(year, mon)[1]:02d}"
+
+def add_stats(total, part):
+    for key, value in part.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+# ------------------- ЖУРНАЛ -------------------
+class HistoryLog:
+    """
+    Только дописывание: append() добавляет одну строку в файл своего месяца,
+    старые записи не читаются и не переписываются. Файл текущего месяца держим открытым.
+    Чтение — потоковое (entries/stats), в память целиком ничего не загружается.
+    """
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        self.handles = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def shard_path(self, month):
+        return os.path.join(self.directory, f"{month}{SHARD_SUFFIX}")
+
+    def months(self):
+        return sorted(f[:-len(SHARD_SUFFIX)] for f in os.listdir(self.directory) if f.endswith(SHARD_SUFFIX))
+
+    def _handle(self, month):
+        handle = self.handles.get(month)
+        if handle is None:
+            # месяц сменился — прежний файл больше не понадобится
+            self.close()
+            handle = open(self.shard_path(month), "a", encoding="utf-8")
+            self.handles[month] = handle
+        return handle
+
+    def append(self, user_id, entry):
+        month = (entry.get("date") or datetime.now().strftime("%Y-%m-%d"))[:7]
+        handle = self._handle(month)
+        handle.write(entry_line(user_id, entry))
+        handle.flush()
+
+    def extend(self, items):
+        """[(user_id, запись), ...] одним заходом — для ночного архивирования"""
+        for user_id, entry in items:
+            month = (entry.get("date") or datetime.now().strftime("%Y-%m-%d"))[:7]
+            self._handle(month).write(entry_line(user_id, entry))
+        for handle in self.handles.values():
+            handle.flush()
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+    def _month_range(self, start, end):
+        return [m for m in self.months() if (not start or m >= start[:7]) and (not end or m <= end[:7])]
+
+    def entries(self, user_id=None, start=None, end=None):
+        """Генератор (user_id, запись) с фильтром по пользователю и датам start <= date <= end"""
+        prefix = user_prefix(user_id) if user_id is not None else None
+        for month in self._month_range(start, end):
+            with open(self.shard_path(month), "r", encoding="utf-8") as f:
+                for line in f:
+                    if prefix is not None and not line.startswith(prefix):
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # недописанная строка после аварийной остановки
+                        continue
+                    date = entry.get("date", "")
+                    if (start and date < start) or (end and date > end):
+                        continue
+                    yield entry.pop("user_id"), entry
+
+    def _summary(self, month):
+        """Сводка сжатого месяца, если она не старее самого файла"""
+        path = os.path.join(self.directory, f"{month}{SUMMARY_SUFFIX}")
+        try:
+            if os.stat(path).st_mtime_ns < os.stat(self.shard_path(month)).st_mtime_ns:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self, user_id, start=None, end=None):
+        """{"days", "tasks", "done"} пользователя; целые сжатые месяцы берутся из сводки"""
+        total = {"days": 0, "tasks": 0, "done": 0}
+        for month in self._month_range(start, end):
+            whole_month = (not start or start <= f"{month}-01") and (not end or end >= month_end(month))
+            summary = self._summary(month) if whole_month else None
+            if summary is not None:
+                add_stats(total, summary.get(user_id, {}))
+                continue
+            by_date = {}
+            for _, entry in self.entries(user_id, max(start or "", f"{month}-01"), min(end or "9999", f"{month}-31")):
+                day = entry.get("date", "")
+                by_date[day] = merge_entries(by_date.get(day), entry)
+            for entry in by_date.values():
+                add_stats(total, entry_stats(entry))
+        return total
+
+    # ------------------- ОБСЛУЖИВАНИЕ -------------------
+    def compact(self, month):
+        """
+        Переписывает файл месяца: повторы (user_id, date) — например, от повторного
+        ночного запуска — сливаются в одну запись (merge_entries), строки сортируются по
+        пользователю и дате. Рядом кладётся сводка по пользователям для stats().
+        """
+        self.close()
+        latest = {}
+        for user_id, entry in self.entries(start=f"{month}-01", end=f"{month}-31"):
+            key = (user_id, entry.get("date", ""))
+            latest[key] = merge_entries(latest.get(key), entry)
+        path = self.shard_path(month)
+        tmp_file = f"{path}.tmp"
+        summary = {}
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for (user_id, _), entry in sorted(latest.items(), key=lambda item: item[0]):
+                f.write(entry_line(user_id, entry))
+                add_stats(summary.setdefault(user_id, {}), entry_stats(entry))
+        os.replace(tmp_file, path)
+        summary_path = os.path.join(self.directory, f"{month}{SUMMARY_SUFFIX}")
+        with open(f"{summary_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(f"{summary_path}.tmp", summary_path)
+        return len(latest)
+
+    def import_legacy(self, legacy_file):
+        """Однократный перенос старого tasks_history.json; исходник переименовывается в .bak"""
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        items = [(user_id, entry) for user_id, entries in legacy.items() for entry in entries]
+        # по месяцам подряд, чтобы каждый файл открывался один раз
+        items.sort(key=lambda item: item[1].get("date", ""))
+        self.extend(items)
+        os.replace(legacy_file, f"{legacy_file}.bak")
+        return sum(len(entries) for entries in legacy.values())
+
+if __name__ == "__main__":
+    # python history_log.py compact [YYYY-MM ...]  — по умолчанию все месяцы до текущего
+    # python history_log.py stats <user_id> [начало [конец]]
+    log = HistoryLog()
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "compact":
+        current = datetime.now().strftime("%Y-%m")
+        for month in sys.argv[2:] or [m for m in log.months() if m < current]:
+            print(f"{month}: {log.compact(month)} записей")
+    elif command == "stats" and len(sys.argv) > 2:
+        start = sys.argv[3] if len(sys.argv) > 3 else None
+        end = sys.argv[4] if len(sys.argv) > 4 else None
+        print(json.dumps(log.stats(sys.argv[2], start, end), ensure_ascii=False))
+    else:
+        print("Использование: python history_log.py compact [YYYY-MM ...] | stats <user_id> [начало [конец]]")
+        sys.exit(1)
@@ -0,0 +1,151 @@
+# metrics.py
+import time
+import threading
+
+# ------------------- МЕТРИКИ -------------------
+# Счётчики, значения и гистограммы в памяти процесса и их выдача в текстовом формате
+# Prometheus (GET /metrics, см. webserver.mount_metrics). Метрики обновляются и из рабочих
+# потоков (save_data идёт через asyncio.to_thread), поэтому у каждой свой Lock.
+
+# секунды: от быстрых хендлеров (~1 мс) до долгих отправок файлов
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = []
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def samples(self):
+        """[(суффикс имени, метки, значение)]"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+class Gauge(Metric):
+    """Текущее значение: задаётся set() или читается функцией в момент выдачи"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(self.labelnames, labels)] = value
+
+    def set_function(self, function, **labels):
+        with self.lock:
+            self.functions[_label_key(self.labelnames, labels)] = function
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            values[key] = function()
+        return [("", _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ключ меток -> [счётчики по корзинам (не накопленные), сумма, количество]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """with histogram.time(...): — наблюдает длительность блока в секундах"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        entry = self.values.get(_label_key(self.labelnames, labels))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, ([*entry[0]], entry[1], entry[2])) for key, entry in self.values.items())
+        result = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                result.append(("_bucket", _format_labels(self.labelnames, key, [("le", f"{bound:g}")]), cumulative))
+            result.append(("_bucket", _format_labels(self.labelnames, key, [("le", "+Inf")]), count))
+            result.append(("_sum", _format_labels(self.labelnames, key), float(total)))
+            result.append(("_count", _format_labels(self.labelnames, key), count))
+        return result
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus 0.0.4"""
+    return "\n".join(metric.render() for metric in registry) + "\n"
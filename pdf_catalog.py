@@ -0,0 +1,120 @@
+# pdf_catalog.py
+import os
+import re
+import sys
+import json
+import hashlib
+
+# ------------------- НАСТРОЙКИ -------------------
+PDF_DIR = "pdfs"
+PDF_INDEX_FILE = "pdfs_index.json"
+
+# "Название (2).pdf" — копия, сохранённая повторно (например, после повторного экспорта)
+COPY_SUFFIX_RE = re.compile(r"\s*\(\d+\)$")
+PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+# ------------------- ПОСТРОЕНИЕ КАТАЛОГА -------------------
+def pdf_title(file_name):
+    stem = os.path.splitext(file_name)[0]
+    stem = COPY_SUFFIX_RE.sub("", stem.strip())
+    return " ".join(stem.replace("_", " ").split())
+
+def pdf_page_count(data):
+    """Грубый подсчёт страниц по объектам /Type /Page; None, если они спрятаны в сжатых потоках"""
+    return len(PAGE_RE.findall(data)) or None
+
+def describe_pdf(pdf_dir, file_name):
+    with open(os.path.join(pdf_dir, file_name), "rb") as f:
+        data = f.read()
+    return {
+        "file": file_name,
+        "title": pdf_title(file_name),
+        "size": len(data),
+        "pages": pdf_page_count(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+def build_catalog(pdf_dir=PDF_DIR):
+    """
+    Хэширует каждый PDF один раз и схлопывает дубликаты: одинаковые по содержимому
+    файлы и копии вида «Название (2).pdf» с тем же названием. Оставляем файл без суффикса.
+    """
+    files = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    # файлы без суффикса копии идут первыми, чтобы именно они становились основными
+    files.sort(key=lambda f: COPY_SUFFIX_RE.search(os.path.splitext(f)[0]) is not None)
+    entries = []
+    by_hash = {}
+    by_title = {}
+    for file_name in files:
+        info = describe_pdf(pdf_dir, file_name)
+        original = by_hash.get(info["sha256"]) or by_title.get(info["title"].casefold())
+        if original is not None:
+            original.setdefault("duplicates", []).append(file_name)
+            continue
+        by_hash[info["sha256"]] = info
+        by_title[info["title"].casefold()] = info
+        entries.append(info)
+    entries.sort(key=lambda e: e["title"])
+    return {"dir_mtime": os.stat(pdf_dir).st_mtime_ns, "entries": entries}
+
+def catalog_version(entries):
+    """Короткий отпечаток состава каталога: меняется, если PDF добавили или удалили"""
+    digest = hashlib.sha1("".join(e["sha256"] for e in entries).encode())
+    return digest.hexdigest()[:12]
+
+def save_catalog(catalog, index_file=PDF_INDEX_FILE):
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_file, index_file)
+
+def load_catalog(pdf_dir=PDF_DIR, index_file=PDF_INDEX_FILE):
+    """Читает индекс; если папка менялась после его построения — перестраивает и сохраняет"""
+    if not os.path.isdir(pdf_dir):
+        return []
+    try:
+        with open(index_file, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("dir_mtime") == os.stat(pdf_dir).st_mtime_ns:
+            return catalog["entries"]
+    except (OSError, ValueError, KeyError):
+        # индекса нет или он повреждён — строим заново
+        pass
+    catalog = build_catalog(pdf_dir)
+    save_catalog(catalog, index_file)
+    return catalog["entries"]
+
+# ------------------- ПЕРЕСТАНОВКА БЕЗ ПОВТОРОВ -------------------
+def _feistel_round(seed, rnd, value):
+    x = (value * 0x9E3779B1 + seed * 0x85EBCA6B + rnd * 0xC2B2AE35) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x7FEB352D) & 0xFFFFFFFF
+    x ^= x >> 15
+    return x
+
+def rotation_index(seed, pos, n):
+    """
+    pos-й элемент псевдослучайной перестановки range(n), заданной seed.
+    Сеть Фейстеля на ближайшей степени четвёрки >= n плюс cycle walking:
+    в среднем O(1), без хранения самой перестановки.
+    """
+    bits = max(2, (n - 1).bit_length())
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+    x = pos
+    while True:
+        left, right = x >> half, x & mask
+        for rnd in range(4):
+            left, right = right, left ^ (_feistel_round(seed, rnd, right) & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+if __name__ == "__main__":
+    # python pdf_catalog.py [папка с PDF] — пересобрать индекс вручную
+    pdf_dir = sys.argv[1] if len(sys.argv) > 1 else PDF_DIR
+    catalog = build_catalog(pdf_dir)
+    save_catalog(catalog)
+    duplicates = sum(len(e.get("duplicates", [])) for e in catalog["entries"])
+    print(f"{len(catalog['entries'])} уникальных PDF, дубликатов: {duplicates}")
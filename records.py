@@ -0,0 +1,256 @@
+# records.py
+import re
+import sys
+from datetime import date
+
+# ------------------- КОМПАКТНЫЕ ЗАПИСИ -------------------
+# Задачи, напоминания, дни рождения и ивенты в памяти JsonStorage — объекты со __slots__
+# вместо dict: строковые поля в слотах, дата — порядковый номер дня (int), время — минуты,
+# флаги — биты одного int, id вида new_id() — число. Снаружи запись ведёт себя как dict
+# (get, [], []=, setdefault, pop, in, dict(record)), поэтому код бота её не различает,
+# а в JSON-файл пишется прежний формат (to_dict). Поля, которых класс не знает, и значения
+# неожиданного вида (дата не по шаблону и т.п.) хранятся как есть в _extra.
+
+HEX_ID_RE = re.compile(r"[0-9a-f]{12}")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+YEARLESS_RE = re.compile(r"--\d{2}-\d{2}")
+TIME_RE = re.compile(r"\d{2}:\d{2}")
+
+# значения с небольшим набором вариантов (тип напоминания, повтор ивента) храним одним объектом
+INTERNED_FIELDS = {"type", "repeat"}
+
+def encode_date(value):
+    """"YYYY-MM-DD" -> порядковый номер (> 0), "--MM-DD" -> -(MM*32 + DD); None — не по шаблону"""
+    if DATE_RE.fullmatch(value):
+        try:
+            return date.fromisoformat(value).toordinal()
+        except ValueError:
+            return None
+    if YEARLESS_RE.fullmatch(value):
+        return -(int(value[2:4]) * 32 + int(value[5:7]))
+    return None
+
+def decode_date(code):
+    if code > 0:
+        return date.fromordinal(code).isoformat()
+    month, day = divmod(-code, 32)
+    return f"--{month:02d}-{day:02d}"
+
+class Record:
+    """
+    Общая часть: id, дата, флаги и прочие поля. Подклассы перечисляют
+    TEXT_FIELDS (строки в одноимённых слотах), FLAGS (биты), HAS_TIME (поле "time").
+    Порядок ключей в to_dict(): id, дата, текстовые поля, время, флаги, прочие.
+    """
+
+    __slots__ = ("_id", "_date", "_flags", "_extra")
+    TEXT_FIELDS = ()
+    FLAGS = ()
+    HAS_TIME = False
+
+    def __init__(self):
+        self._id = None
+        # 0 — даты нет
+        self._date = 0
+        # на флаг два бита: «поле есть» и значение
+        self._flags = 0
+        self._extra = None
+
+    # ---------- доступ как к dict ----------
+    def get(self, key, default=None):
+        value = self._read(key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self._read(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._read(key) is not _MISSING
+
+    def __setitem__(self, key, value):
+        if self._extra and key in self._extra:
+            del self._extra[key]
+        if not self._write(key, value):
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._erase(key)
+
+    def setdefault(self, key, default=None):
+        value = self._read(key)
+        if value is _MISSING:
+            self[key] = value = default
+        return value
+
+    def pop(self, key, *default):
+        value = self._read(key)
+        if value is _MISSING:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._erase(key)
+        return value
+
+    def keys(self):
+        return [key for key in self._all_keys() if key in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @classmethod
+    def from_dict(cls, data):
+        # как __setitem__, но без проверок _extra: запись только что создана
+        record = cls()
+        write = record._write
+        for key, value in data.items():
+            if not write(key, value):
+                if record._extra is None:
+                    record._extra = {}
+                record._extra[key] = value
+        return record
+
+    # ---------- хранение полей ----------
+    def _all_keys(self):
+        keys = ["id", "date", *self.TEXT_FIELDS]
+        if self.HAS_TIME:
+            keys.append("time")
+        keys.extend(self.FLAGS)
+        if self._extra:
+            keys.extend(k for k in self._extra if k not in keys)
+        return keys
+
+    def _read(self, key):
+        if key == "id":
+            if self._id is not None:
+                return f"{self._id:012x}" if isinstance(self._id, int) else self._id
+        elif key == "date":
+            if self._date:
+                return decode_date(self._date)
+        elif key in self.TEXT_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif key == "time" and self.HAS_TIME:
+            if self._time >= 0:
+                return f"{self._time // 60:02d}:{self._time % 60:02d}"
+        elif key in self.FLAGS:
+            bit = self.FLAGS.index(key) * 2
+            if self._flags >> bit & 1:
+                return bool(self._flags >> (bit + 1) & 1)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return _MISSING
+
+    def _write(self, key, value):
+        """True, если поле легло в слот; иначе значение уйдёт в _extra"""
+        if key == "id" and isinstance(value, str):
+            self._id = int(value, 16) if HEX_ID_RE.fullmatch(value) else value
+            return True
+        if key == "date" and isinstance(value, str):
+            code = encode_date(value)
+            if code is not None:
+                self._date = code
+                return True
+            self._date = 0
+            return False
+        if key in self.TEXT_FIELDS and isinstance(value, str):
+            setattr(self, key, sys.intern(value) if key in INTERNED_FIELDS else value)
+            return True
+        if key == "time" and self.HAS_TIME and isinstance(value, str) and TIME_RE.fullmatch(value):
+            self._time = int(value[:2]) * 60 + int(value[3:])
+            return True
+        if key in self.FLAGS and isinstance(value, bool):
+            bit = self.FLAGS.index(key) * 2
+            self._flags = self._flags & ~(3 << bit) | (1 | value << 1) << bit
+            return True
+        # значение нестандартного вида: слот очищаем, чтобы не было двух версий поля
+        self._erase_slot(key)
+        return False
+
+    def _erase_slot(self, key):
+        if key == "id":
+            self._id = None
+        elif key == "date":
+            self._date = 0
+        elif key in self.TEXT_FIELDS:
+            setattr(self, key, None)
+        elif key == "time" and self.HAS_TIME:
+            self._time = -1
+        elif key in self.FLAGS:
+            self._flags &= ~(3 << self.FLAGS.index(key) * 2)
+
+    def _erase(self, key):
+        self._erase_slot(key)
+        if self._extra:
+            self._extra.pop(key, None)
+
+_MISSING = object()
+
+class Task(Record):
+    __slots__ = ("text",)
+    TEXT_FIELDS = ("text",)
+    FLAGS = ("done",)
+
+    def __init__(self):
+        super().__init__()
+        self.text = None
+
+class Reminder(Record):
+    __slots__ = ("text", "type", "_time")
+    TEXT_FIELDS = ("text", "type")
+    FLAGS = ("enabled", "fired_today")
+    HAS_TIME = True
+
+    def __init__(self):
+        super().__init__()
+        self.text = None
+        self.type = None
+        # минуты от полуночи; -1 — времени нет
+        self._time = -1
+
+class Birthday(Record):
+    __slots__ = ("name",)
+    TEXT_FIELDS = ("name",)
+
+    def __init__(self):
+        super().__init__()
+        self.name = None
+
+class Event(Record):
+    __slots__ = ("title", "repeat")
+    TEXT_FIELDS = ("title", "repeat")
+
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self.repeat = None
+
+RECORD_TYPES = {"tasks": Task, "reminders": Reminder, "birthdays": Birthday, "events": Event}
+
+def to_plain(record):
+    """Запись для json.dumps: Record -> dict, dict — как есть"""
+    return record.to_dict() if isinstance(record, Record) else record
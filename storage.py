@@ -0,0 +1,910 @@
+# storage.py
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from history_log import HISTORY_DIR, HistoryLog
+from metrics import Counter, Histogram
+from records import RECORD_TYPES, Record, to_plain
+
+# ------------------- НАСТРОЙКИ -------------------
+TASKS_FILE = "tasks.json"
+REMINDERS_FILE = "reminders.json"
+BIRTHDAYS_FILE = "birthdays.json"
+EVENTS_FILE = "events.json"
+# прежний формат истории: один JSON на всё время, переносится в HistoryLog при запуске
+TASKS_HISTORY_FILE = "tasks_history.json"
+# user_id -> {"digest": bool, "tz": ..., "pdf_rotation": {...}}: личные настройки пользователя
+USER_SETTINGS_FILE = "user_settings.json"
+
+JSON_FILES = {
+    "tasks": TASKS_FILE,
+    "reminders": REMINDERS_FILE,
+    "birthdays": BIRTHDAYS_FILE,
+    "events": EVENTS_FILE,
+}
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot.db")
+SAVE_DELAY = float(os.getenv("SAVE_DELAY", "2.0"))
+# STORAGE_BACKEND=sharded: папка с файлами пользователей и сколько пользователей держать в памяти
+USERS_DIR = os.getenv("USERS_DIR", "users")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+
+save_duration = Histogram("bot_save_data_seconds", "Время записи JSON-файла (save_data)", ["file"])
+save_bytes = Counter("bot_save_data_bytes_total", "Байт записано save_data", ["file"])
+user_loads = Counter("bot_user_cache_loads_total", "Пользователей прочитано с диска (STORAGE_BACKEND=sharded)")
+user_evictions = Counter("bot_user_cache_evictions_total", "Пользователей вытеснено из памяти (STORAGE_BACKEND=sharded)")
+
+# ------------------- УТИЛИТЫ -------------------
+def load_data(file):
+    if os.path.exists(file):
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.exception("Не удалось прочитать %s, начинаем с пустых данных", file)
+            return {}
+    return {}
+
+def save_data(file, data):
+    # пишем во временный файл и атомарно подменяем, чтобы сбой не оставил обрезанный JSON;
+    # pid в имени — чтобы несколько процессов-воркеров не писали в один и тот же .tmp
+    started = time.perf_counter()
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        # Record (records.py) пишется в прежнем виде — обычным объектом JSON
+        json.dump(data, f, ensure_ascii=False, indent=2, default=to_plain)
+        size = f.tell()
+    os.replace(tmp_file, file)
+    name = os.path.basename(file)
+    save_duration.observe(time.perf_counter() - started, file=name)
+    save_bytes.inc(size, file=name)
+
+def snapshot_data(data):
+    """
+    Копия словаря вида {ключ: [dict | Record, ...] | dict | значение},
+    которую можно сериализовать в другом потоке
+    """
+    snapshot = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            value = [
+                item.to_dict() if isinstance(item, Record) else dict(item) if isinstance(item, dict) else item
+                for item in value
+            ]
+        elif isinstance(value, dict):
+            value = dict(value)
+        snapshot[key] = value
+    return snapshot
+
+async def save_data_async(file, data):
+    """Сохраняет снимок данных в рабочем потоке, не блокируя event loop"""
+    await asyncio.to_thread(save_data, file, snapshot_data(data))
+
+def new_id():
+    """Короткий стабильный идентификатор записи (помещается в callback_data)"""
+    return uuid.uuid4().hex[:12]
+
+# ------------------- ОТЛОЖЕННАЯ ЗАПИСЬ -------------------
+class WriteBehindStore:
+    """
+    Обработчики только помечают файл «грязным» через mark_dirty().
+    Все изменения за SAVE_DELAY секунд сливаются в одну запись на файл,
+    сериализация идёт в рабочем потоке. flush() вызывается и при остановке бота.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.dirty = {}
+        # файлы, которые flush() сейчас записывает: их данные ещё не на диске
+        self.writing = {}
+        self.flush_task = None
+        self.lock = asyncio.Lock()
+
+    def mark_dirty(self, file, data):
+        self.dirty[file] = data
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # вне event loop (скрипты, миграции) — пишем сразу
+            self.dirty.pop(file)
+            save_data(file, data)
+            return
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # повторяем, пока во время записи появляются новые изменения
+        while self.dirty:
+            await asyncio.sleep(self.delay)
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            pending, self.dirty = self.dirty, {}
+            self.writing = pending
+            try:
+                for file, data in pending.items():
+                    try:
+                        await save_data_async(file, data)
+                    except Exception:
+                        logger.exception("Не удалось сохранить %s", file)
+                        self.dirty.setdefault(file, data)
+            finally:
+                self.writing = {}
+
+    def pending(self, file):
+        """Данные файла, ещё не записанные на диск (или None): читать файл сейчас нельзя"""
+        data = self.dirty.get(file)
+        return data if data is not None else self.writing.get(file)
+
+    async def close(self):
+        """Дожидается отложенной записи и сбрасывает всё немедленно"""
+        self.delay = 0
+        if self.flush_task is not None and not self.flush_task.done():
+            await self.flush_task
+        await self.flush()
+
+# ------------------- ИНДЕКС ЗАПИСЕЙ ПОЛЬЗОВАТЕЛЯ -------------------
+class UserIndex:
+    """
+    Записи одного пользователя: id -> запись и отсортированный список ключей
+    (date, порядковый номер, id). Поиск по id — O(1), выборка дня/месяца — бисекция.
+    """
+
+    __slots__ = ("by_id", "keys", "key_of", "seq")
+
+    def __init__(self, records=()):
+        self.by_id = {}
+        self.keys = []
+        self.key_of = {}
+        self.seq = 0
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        self.seq += 1
+        key = (record.get("date") or "", self.seq, record["id"])
+        self.by_id[record["id"]] = record
+        self.key_of[record["id"]] = key
+        insort(self.keys, key)
+
+    def remove(self, record_id):
+        key = self.key_of.pop(record_id, None)
+        if key is None:
+            return None
+        del self.keys[bisect_left(self.keys, key)]
+        return self.by_id.pop(record_id)
+
+    def replace(self, record):
+        """Обновляет запись; если поменялась дата — переставляет ключ"""
+        key = self.key_of.get(record["id"])
+        if key is None or key[0] != (record.get("date") or ""):
+            self.remove(record["id"])
+            self.add(record)
+        else:
+            self.by_id[record["id"]] = record
+
+    def span(self, start, end):
+        """Границы [lo, hi) записей с датой в диапазоне в отсортированном списке ключей"""
+        return bisect_left(self.keys, (start,)), bisect_right(self.keys, (end, float("inf")))
+
+    def between(self, start, end, offset=0, limit=None):
+        lo, hi = self.span(start, end)
+        lo += offset
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.by_id[key[2]] for key in self.keys[lo:hi]]
+
+    def count_between(self, start, end):
+        lo, hi = self.span(start, end)
+        return hi - lo
+
+class DayIndex:
+    """
+    Дата -> {user_id: число записей} по всем пользователям вида данных.
+    Отвечает, у кого есть записи в диапазоне дат, не перебирая всех пользователей.
+    """
+
+    __slots__ = ("users", "days")
+
+    def __init__(self):
+        self.users = {}
+        self.days = []
+
+    def add(self, day, user_id, count=1):
+        counts = self.users.get(day)
+        if counts is None:
+            counts = self.users[day] = {}
+            insort(self.days, day)
+        counts[user_id] = counts.get(user_id, 0) + count
+
+    def remove(self, day, user_id, count=1):
+        counts = self.users.get(day)
+        if counts is None or user_id not in counts:
+            return
+        counts[user_id] -= count
+        if counts[user_id] <= 0:
+            del counts[user_id]
+        if not counts:
+            del self.users[day]
+            del self.days[bisect_left(self.days, day)]
+
+    def users_between(self, start, end):
+        found = set()
+        for day in self.days[bisect_left(self.days, start):bisect_right(self.days, end)]:
+            found.update(self.users[day])
+        return found
+
+# ------------------- ВЕРСИИ ДАННЫХ -------------------
+class VersionedStorage:
+    """
+    Счётчик изменений по пользователю: любая запись меняет version(user_id),
+    поэтому кэши отрисовки сравнивают версию вместо того, чтобы перечитывать данные.
+    """
+
+    def __init__(self):
+        self.epoch = 0
+        self.versions = {}
+
+    def touch(self, user_id):
+        self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+    def touch_all(self):
+        self.epoch += 1
+
+    def version(self, user_id):
+        return (self.epoch, self.versions.get(user_id, 0))
+
+# ------------------- ХРАНИЛИЩЕ: JSON -------------------
+class JsonStorage(VersionedStorage):
+    """
+    Прежний формат: по JSON-файлу на вид данных, всё в памяти.
+    Любое изменение помечает файл целиком, запись — через WriteBehindStore.
+    Списки, которые возвращает user_records(), — живые: менять запись можно на месте,
+    после чего вызвать update(). Индексы пользователей (UserIndex) строятся при первом обращении.
+    История задач в память не грузится: она дописывается в HistoryLog.
+    Записи в памяти — компактные Record (records.py), а не dict; add() и update()
+    принимают и обычные dict и возвращают/хранят Record.
+    """
+
+    def __init__(self, files=JSON_FILES, history_dir=HISTORY_DIR, writer=None, settings_file=USER_SETTINGS_FILE):
+        super().__init__()
+        self.files = dict(files)
+        self.writer = writer
+        self.data = {kind: self._load_records(kind, path) for kind, path in self.files.items()}
+        self.settings_file = settings_file
+        self.settings = load_data(settings_file)
+        self.history = HistoryLog(history_dir)
+        if os.path.exists(TASKS_HISTORY_FILE):
+            count = self.history.import_legacy(TASKS_HISTORY_FILE)
+            logger.info("История задач: перенесено %d записей из %s", count, TASKS_HISTORY_FILE)
+        self.indexes = {kind: {} for kind in self.files}
+        self.day_indexes = {}
+        for kind, by_user in self.data.items():
+            # записи из старых файлов получают id при первой загрузке
+            missing = [r for items in by_user.values() for r in items if "id" not in r]
+            for record in missing:
+                record["id"] = new_id()
+            if missing:
+                self._save(kind)
+
+    @staticmethod
+    def _load_records(kind, path):
+        record_type = RECORD_TYPES.get(kind)
+        data = load_data(path)
+        if record_type is None:
+            return data
+        return {
+            user_id: [record_type.from_dict(r) if isinstance(r, dict) else r for r in items]
+            for user_id, items in data.items()
+        }
+
+    def _as_record(self, kind, record):
+        record_type = RECORD_TYPES.get(kind)
+        if record_type is None or isinstance(record, Record):
+            return record
+        return record_type.from_dict(record)
+
+    def _save(self, kind, user_id=None):
+        if self.writer is not None:
+            self.writer.mark_dirty(self.files[kind], self.data[kind])
+
+    def _records(self, kind, user_id, create=False):
+        """Живой список записей пользователя; create — завести пустой, если его нет"""
+        if create:
+            return self.data[kind].setdefault(user_id, [])
+        return self.data[kind].get(user_id, [])
+
+    def _index(self, kind, user_id):
+        index = self.indexes[kind].get(user_id)
+        if index is None:
+            index = UserIndex(self._records(kind, user_id))
+            self.indexes[kind][user_id] = index
+        return index
+
+    def _day_index(self, kind):
+        index = self.day_indexes.get(kind)
+        if index is None:
+            index = DayIndex()
+            for user_id, items in self.data[kind].items():
+                for record in items:
+                    index.add(record.get("date") or "", user_id)
+            self.day_indexes[kind] = index
+        return index
+
+    def users(self, kind):
+        return [uid for uid, items in self.data[kind].items() if items]
+
+    def users_between(self, kind, start, end):
+        """Пользователи, у которых есть записи с датой start <= date <= end"""
+        return sorted(self._day_index(kind).users_between(start, end))
+
+    def user_records(self, kind, user_id):
+        return self._records(kind, user_id)
+
+    def all_records(self, kind):
+        for user_id, items in list(self.data[kind].items()):
+            for record in list(items):
+                yield user_id, record
+
+    def enabled_reminders(self):
+        for user_id, rem in self.all_records("reminders"):
+            if rem.get("enabled", True):
+                yield user_id, rem
+
+    def records_between(self, kind, user_id, start, end, offset=0, limit=None):
+        """
+        Записи с датой start <= date <= end (строки YYYY-MM-DD), по возрастанию даты;
+        записи без даты считаются датой "". offset/limit — страница выборки.
+        """
+        return self._index(kind, user_id).between(start, end, offset, limit)
+
+    def count_between(self, kind, user_id, start, end):
+        return self._index(kind, user_id).count_between(start, end)
+
+    def get(self, kind, user_id, record_id):
+        return self._index(kind, user_id).by_id.get(record_id)
+
+    def event_rules(self, kind):
+        """(user_id, дата, повтор или None, число записей) по всем пользователям — для EventCalendar.users_on"""
+        for user_id, record in self.all_records(kind):
+            yield user_id, record.get("date") or "", record.get("repeat"), 1
+
+    def add(self, kind, user_id, record):
+        # id ставим и в переданный dict: вызывающий код мог оставить ссылку на него
+        record.setdefault("id", new_id())
+        record = self._as_record(kind, record)
+        index = self._index(kind, user_id)
+        self._records(kind, user_id, create=True).append(record)
+        index.add(record)
+        if kind in self.day_indexes:
+            self.day_indexes[kind].add(record.get("date") or "", user_id)
+        self.touch(user_id)
+        self._save(kind, user_id)
+        return record
+
+    def update(self, kind, user_id, record):
+        index = self._index(kind, user_id)
+        current = index.by_id.get(record["id"])
+        if current is None:
+            return
+        record = self._as_record(kind, record)
+        if current is not record:
+            items = self._records(kind, user_id)
+            items[next(i for i, r in enumerate(items) if r is current)] = record
+        # прежнюю дату берём из ключа индекса: запись могли поменять на месте
+        old_day = index.key_of[record["id"]][0]
+        if kind in self.day_indexes and old_day != (record.get("date") or ""):
+            self.day_indexes[kind].remove(old_day, user_id)
+            self.day_indexes[kind].add(record.get("date") or "", user_id)
+        index.replace(record)
+        self.touch(user_id)
+        self._save(kind, user_id)
+
+    def delete(self, kind, user_id, record_id):
+        record = self._index(kind, user_id).remove(record_id)
+        if record is None:
+            return None
+        items = self._records(kind, user_id)
+        # удаляем по идентичности объекта, найденного через индекс
+        del items[next(i for i, r in enumerate(items) if r is record)]
+        if kind in self.day_indexes:
+            self.day_indexes[kind].remove(record.get("date") or "", user_id)
+        self.touch(user_id)
+        self._save(kind, user_id)
+        return record
+
+    def clear(self, kind):
+        self.data[kind].clear()
+        self.indexes[kind].clear()
+        self.day_indexes.pop(kind, None)
+        self.touch_all()
+        self._save(kind)
+
+    def append_history(self, user_id, entry):
+        if "tasks" in entry:
+            entry = dict(entry, tasks=[to_plain(t) for t in entry["tasks"]])
+        self.history.append(user_id, entry)
+
+    def health(self):
+        pending = len(self.writer.dirty) if self.writer is not None else 0
+        return True, {"backend": "json", "pending_writes": pending}
+
+    def history_entries(self, user_id=None, start=None, end=None):
+        return self.history.entries(user_id, start, end)
+
+    def all_user_settings(self):
+        return list(self.settings.items())
+
+    def set_user_settings(self, user_id, settings):
+        self.settings[user_id] = settings
+        if self.writer is not None:
+            self.writer.mark_dirty(self.settings_file, self.settings)
+
+    async def close(self):
+        self.history.close()
+        if self.writer is not None:
+            await self.writer.close()
+
+# ------------------- ХРАНИЛИЩЕ: ФАЙЛ НА ПОЛЬЗОВАТЕЛЯ -------------------
+# виды данных, которые лежат в файлах пользователей; напоминания и настройки — общие файлы
+SHARDED_KINDS = ("tasks", "birthdays", "events")
+
+def shard_of(user_id):
+    """Подпапка пользователя — две последние цифры id: 100 папок, заполненных примерно поровну"""
+    return user_id[-2:].rjust(2, "0")
+
+def user_file(users_dir, user_id):
+    return os.path.join(users_dir, shard_of(user_id), f"{user_id}.json")
+
+def catalog_file(users_dir, shard):
+    return os.path.join(users_dir, shard, "catalog.json")
+
+def catalog_key(kind, record):
+    """Ключ строки каталога: дата записи, у ивента с повтором — "дата/повтор" (для EventCalendar.users_on)"""
+    day = record.get("date") or ""
+    repeat = record.get("repeat") if kind == "events" else None
+    return f"{day}/{repeat}" if repeat else day
+
+def catalog_day(key):
+    return key.partition("/")[0]
+
+def load_user_records(data):
+    """Содержимое файла пользователя -> {вид: [Record, ...]} по всем SHARDED_KINDS"""
+    return {kind: [RECORD_TYPES[kind].from_dict(r) for r in data.get(kind, [])] for kind in SHARDED_KINDS}
+
+class UserShardStorage(JsonStorage):
+    """
+    Задачи, дни рождения и ивенты — по файлу на пользователя: USERS_DIR/<NN>/<user_id>.json.
+    В памяти только недавно активные пользователи (LRU до cache_size человек): файл читается
+    при первом обращении к пользователю, при вытеснении его несохранённые изменения остаются
+    в очереди WriteBehindStore до записи. При запуске файлы пользователей не читаются.
+    Напоминания и настройки остаются общими файлами, как в JsonStorage: планировщику при
+    запуске всё равно нужны все напоминания.
+    Выборки по всем пользователям (кому переносить задачи, кому слать сводку) идут по каталогу
+    USERS_DIR/<NN>/catalog.json: {вид: {user_id: {ключ: число записей}}}, ключ — catalog_key().
+    Он читается при первой такой выборке и переписывается, только когда у пользователя меняется
+    набор ключей, так что файлы пользователей без записей на нужный день не читаются.
+    Как и в SqliteStorage, запись, полученная до вытеснения пользователя, — уже копия:
+    изменения нужно сохранять через update().
+    """
+
+    def __init__(self, users_dir=USERS_DIR, cache_size=USER_CACHE_SIZE, writer=None,
+                 files=None, history_dir=HISTORY_DIR, settings_file=USER_SETTINGS_FILE):
+        if files is None:
+            files = {kind: path for kind, path in JSON_FILES.items() if kind not in SHARDED_KINDS}
+        super().__init__(files, history_dir, writer, settings_file)
+        self.users_dir = users_dir
+        self.cache_size = cache_size
+        # user_id -> {вид: [Record, ...]}, от давно не использованных к недавним
+        self.cache = OrderedDict()
+        self.user_indexes = {}
+        # функции f(user_id), которые сбрасывают свои индексы по вытесненному пользователю
+        self.eviction_listeners = []
+        # номер папки -> каталог; all_catalogs_loaded — прочитаны ли все папки
+        self.catalogs = {}
+        self.all_catalogs_loaded = False
+        self.catalog_indexes = {}
+
+    # ---------- рабочий набор пользователей ----------
+    def _user(self, user_id):
+        entry = self.cache.get(user_id)
+        if entry is not None:
+            self.cache.move_to_end(user_id)
+            return entry
+        path = user_file(self.users_dir, user_id)
+        # файл мог ещё не записаться после вытеснения — тогда актуальны данные из очереди записи
+        entry = self.writer.pending(path) if self.writer is not None else None
+        if entry is None:
+            entry = load_user_records(load_data(path))
+            user_loads.inc()
+        self.cache[user_id] = entry
+        while len(self.cache) > self.cache_size:
+            evicted, _ = self.cache.popitem(last=False)
+            self.user_indexes.pop(evicted, None)
+            for listener in self.eviction_listeners:
+                listener(evicted)
+            user_evictions.inc()
+        return entry
+
+    def _records(self, kind, user_id, create=False):
+        if kind not in SHARDED_KINDS:
+            return super()._records(kind, user_id, create)
+        return self._user(user_id)[kind]
+
+    def _index(self, kind, user_id):
+        if kind not in SHARDED_KINDS:
+            return super()._index(kind, user_id)
+        items = self._records(kind, user_id)
+        indexes = self.user_indexes.setdefault(user_id, {})
+        index = indexes.get(kind)
+        if index is None:
+            index = indexes[kind] = UserIndex(items)
+        return index
+
+    def _save(self, kind, user_id=None):
+        if kind not in SHARDED_KINDS:
+            return super()._save(kind, user_id)
+        self._sync_catalog(kind, user_id)
+        self._mark_dirty(user_file(self.users_dir, user_id), self._user(user_id))
+
+    def _mark_dirty(self, path, data):
+        if self.writer is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.writer.mark_dirty(path, data)
+
+    # ---------- каталог для выборок по всем пользователям ----------
+    def _catalog(self, shard):
+        catalog = self.catalogs.get(shard)
+        if catalog is None:
+            catalog = load_data(catalog_file(self.users_dir, shard))
+            for kind in SHARDED_KINDS:
+                catalog.setdefault(kind, {})
+            self.catalogs[shard] = catalog
+        return catalog
+
+    def _all_catalogs(self):
+        if not self.all_catalogs_loaded:
+            if os.path.isdir(self.users_dir):
+                for shard in sorted(os.listdir(self.users_dir)):
+                    if os.path.isdir(os.path.join(self.users_dir, shard)):
+                        self._catalog(shard)
+            self.all_catalogs_loaded = True
+        return list(self.catalogs.values())
+
+    def _sync_catalog(self, kind, user_id):
+        """Обновляет строку каталога по записям пользователя; файл каталога пишется, только если она изменилась"""
+        days = {}
+        for record in self._records(kind, user_id):
+            key = catalog_key(kind, record)
+            days[key] = days.get(key, 0) + 1
+        shard = shard_of(user_id)
+        catalog = self._catalog(shard)
+        old = catalog[kind].get(user_id, {})
+        if days == old:
+            return
+        # строку заменяем, а не меняем на месте: снимок для записи в другом потоке копирует только верхние уровни
+        if days:
+            catalog[kind][user_id] = days
+        else:
+            catalog[kind].pop(user_id, None)
+        day_index = self.catalog_indexes.get(kind)
+        if day_index is not None:
+            for key, count in old.items():
+                day_index.remove(catalog_day(key), user_id, count)
+            for key, count in days.items():
+                day_index.add(catalog_day(key), user_id, count)
+        self._mark_dirty(catalog_file(self.users_dir, shard), catalog)
+
+    def _day_index(self, kind):
+        if kind not in SHARDED_KINDS:
+            return super()._day_index(kind)
+        index = self.catalog_indexes.get(kind)
+        if index is None:
+            index = DayIndex()
+            for catalog in self._all_catalogs():
+                for user_id, days in catalog[kind].items():
+                    for key, count in days.items():
+                        index.add(catalog_day(key), user_id, count)
+            self.catalog_indexes[kind] = index
+        return index
+
+    def event_rules(self, kind):
+        if kind not in SHARDED_KINDS:
+            yield from super().event_rules(kind)
+            return
+        for catalog in self._all_catalogs():
+            for user_id, days in catalog[kind].items():
+                for key, count in days.items():
+                    day, _, repeat = key.partition("/")
+                    yield user_id, day, repeat or None, count
+
+    def users(self, kind):
+        if kind not in SHARDED_KINDS:
+            return super().users(kind)
+        return [user_id for catalog in self._all_catalogs() for user_id in catalog[kind]]
+
+    def all_records(self, kind):
+        if kind not in SHARDED_KINDS:
+            yield from super().all_records(kind)
+            return
+        for user_id in self.users(kind):
+            for record in list(self._records(kind, user_id)):
+                yield user_id, record
+
+    def clear(self, kind):
+        if kind not in SHARDED_KINDS:
+            return super().clear(kind)
+        for user_id in self.users(kind):
+            self._user(user_id)[kind] = []
+            self.user_indexes.get(user_id, {}).pop(kind, None)
+            self._save(kind, user_id)
+        self.touch_all()
+
+    def health(self):
+        pending = len(self.writer.dirty) if self.writer is not None else 0
+        return True, {"backend": "sharded", "cached_users": len(self.cache), "pending_writes": pending}
+
+# ------------------- ХРАНИЛИЩЕ: SQLITE -------------------
+# Одна схема на все виды записей: запись целиком лежит в data (JSON),
+# а поля, по которым ищем, вынесены в отдельные колонки под индексы.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {kind} (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    date TEXT,
+    time TEXT,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL
+);
+"""
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS tasks_user_date ON tasks(user_id, date)",
+    "CREATE INDEX IF NOT EXISTS tasks_date ON tasks(date)",
+    "CREATE INDEX IF NOT EXISTS events_user_date ON events(user_id, date)",
+    "CREATE INDEX IF NOT EXISTS birthdays_user_date ON birthdays(user_id, date)",
+    "CREATE INDEX IF NOT EXISTS reminders_time_enabled ON reminders(time, enabled)",
+    "CREATE INDEX IF NOT EXISTS reminders_user ON reminders(user_id)",
+    "CREATE INDEX IF NOT EXISTS reminders_user_date ON reminders(user_id, date)",
+    "CREATE INDEX IF NOT EXISTS tasks_history_user_date ON tasks_history(user_id, date)",
+]
+SQLITE_SETTINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+class SqliteStorage(VersionedStorage):
+    """
+    SQLite в режиме WAL. В памяти ничего не держим: каждый клик читает и пишет
+    только свои строки, выборки по дню/месяцу идут по индексу (user_id, date).
+    Возвращаемые записи — копии: после изменения нужно вызвать update().
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        super().__init__()
+        self.path = path
+        # timeout — ожидание блокировки, когда в ту же базу пишут другие процессы-воркеры
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for kind in list(JSON_FILES) + ["tasks_history"]:
+            self.conn.execute(SQLITE_SCHEMA.format(kind=kind))
+        self.conn.execute(SQLITE_SETTINGS_SCHEMA)
+        for ddl in SQLITE_INDEXES:
+            self.conn.execute(ddl)
+
+    @staticmethod
+    def _row_values(user_id, record):
+        return (
+            record["id"],
+            user_id,
+            record.get("date"),
+            record.get("time"),
+            1 if record.get("enabled", True) else 0,
+            json.dumps(record, ensure_ascii=False, default=to_plain),
+        )
+
+    def _select(self, kind, where, params):
+        rows = self.conn.execute(f"SELECT data FROM {kind} WHERE {where}", params)
+        return [json.loads(data) for (data,) in rows]
+
+    def users(self, kind):
+        return [uid for (uid,) in self.conn.execute(f"SELECT DISTINCT user_id FROM {kind}")]
+
+    def users_between(self, kind, start, end):
+        rows = self.conn.execute(f"SELECT DISTINCT user_id FROM {kind} WHERE date BETWEEN ? AND ? ORDER BY user_id", (start, end))
+        return [uid for (uid,) in rows]
+
+    def user_records(self, kind, user_id):
+        return self._select(kind, "user_id = ? ORDER BY seq", (user_id,))
+
+    def all_records(self, kind):
+        rows = self.conn.execute(f"SELECT user_id, data FROM {kind} ORDER BY seq")
+        for user_id, data in rows.fetchall():
+            yield user_id, json.loads(data)
+
+    def event_rules(self, kind):
+        rows = self.conn.execute(
+            f"SELECT user_id, COALESCE(date, ''), json_extract(data, '$.repeat'), COUNT(*) FROM {kind} GROUP BY 1, 2, 3"
+        )
+        return rows.fetchall()
+
+    def enabled_reminders(self):
+        rows = self.conn.execute("SELECT user_id, data FROM reminders WHERE enabled = 1 ORDER BY time")
+        for user_id, data in rows.fetchall():
+            yield user_id, json.loads(data)
+
+    @staticmethod
+    def _date_range(start):
+        # как в JsonStorage: запись без даты (NULL) попадает в диапазон, начинающийся с ""
+        if start == "":
+            return "user_id = ? AND (date BETWEEN ? AND ? OR date IS NULL)"
+        return "user_id = ? AND date BETWEEN ? AND ?"
+
+    def records_between(self, kind, user_id, start, end, offset=0, limit=None):
+        where = self._date_range(start) + " ORDER BY date, seq LIMIT ? OFFSET ?"
+        return self._select(kind, where, (user_id, start, end, -1 if limit is None else limit, offset))
+
+    def count_between(self, kind, user_id, start, end):
+        row = self.conn.execute(f"SELECT COUNT(*) FROM {kind} WHERE {self._date_range(start)}", (user_id, start, end))
+        return row.fetchone()[0]
+
+    def get(self, kind, user_id, record_id):
+        found = self._select(kind, "user_id = ? AND id = ?", (user_id, record_id))
+        return found[0] if found else None
+
+    def add(self, kind, user_id, record):
+        record.setdefault("id", new_id())
+        self.conn.execute(
+            f"INSERT INTO {kind} (id, user_id, date, time, enabled, data) VALUES (?, ?, ?, ?, ?, ?)",
+            self._row_values(user_id, record),
+        )
+        self.touch(user_id)
+        return record
+
+    def update(self, kind, user_id, record):
+        self.conn.execute(
+            f"INSERT INTO {kind} (id, user_id, date, time, enabled, data) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET date = excluded.date, time = excluded.time, "
+            "enabled = excluded.enabled, data = excluded.data",
+            self._row_values(user_id, record),
+        )
+        self.touch(user_id)
+
+    def delete(self, kind, user_id, record_id):
+        record = self.get(kind, user_id, record_id)
+        if record is not None:
+            self.conn.execute(f"DELETE FROM {kind} WHERE id = ?", (record_id,))
+            self.touch(user_id)
+        return record
+
+    def clear(self, kind):
+        self.conn.execute(f"DELETE FROM {kind}")
+        self.touch_all()
+
+    def append_history(self, user_id, entry):
+        entry = dict(entry, id=new_id())
+        self.conn.execute(
+            "INSERT INTO tasks_history (id, user_id, date, data) VALUES (?, ?, ?, ?)",
+            (entry["id"], user_id, entry.get("date"), json.dumps(entry, ensure_ascii=False)),
+        )
+
+    def history_entries(self, user_id=None, start=None, end=None):
+        where, params = ["date BETWEEN ? AND ?"], [start or "", end or "9999-12-31"]
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        rows = self.conn.execute(f"SELECT user_id, data FROM tasks_history WHERE {' AND '.join(where)} ORDER BY date, seq", params)
+        for user_id, data in rows:
+            yield user_id, json.loads(data)
+
+    def all_user_settings(self):
+        rows = self.conn.execute("SELECT user_id, data FROM user_settings")
+        return [(user_id, json.loads(data)) for user_id, data in rows]
+
+    def set_user_settings(self, user_id, settings):
+        self.conn.execute(
+            "INSERT INTO user_settings (user_id, data) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+            (user_id, json.dumps(settings, ensure_ascii=False)),
+        )
+
+    def health(self):
+        try:
+            self.conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error as e:
+            return False, {"backend": "sqlite", "error": str(e)}
+        return True, {"backend": "sqlite", "path": self.path}
+
+    async def close(self):
+        self.conn.close()
+
+# ------------------- ВЫБОР И МИГРАЦИЯ -------------------
+def open_storage(backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SqliteStorage(SQLITE_PATH)
+    if backend == "sharded":
+        return UserShardStorage(writer=WriteBehindStore(SAVE_DELAY))
+    return JsonStorage(writer=WriteBehindStore(SAVE_DELAY))
+
+def migrate_json_to_sqlite(db_path=SQLITE_PATH, files=JSON_FILES, history_dir=HISTORY_DIR):
+    """Однократный перенос JSON-файлов и журнала истории в SQLite. Исходные файлы не меняются."""
+    source = JsonStorage(files, history_dir)
+    target = SqliteStorage(db_path)
+    for kind in list(files) + ["tasks_history"]:
+        if target.conn.execute(f"SELECT 1 FROM {kind} LIMIT 1").fetchone():
+            target.conn.close()
+            raise RuntimeError(f"{db_path}: таблица {kind} не пуста, миграция уже выполнялась")
+    counts = {}
+    with target.conn:
+        target.conn.execute("BEGIN")
+        for kind in files:
+            counts[kind] = 0
+            for user_id, record in source.all_records(kind):
+                target.update(kind, user_id, record)
+                counts[kind] += 1
+        counts["tasks_history"] = 0
+        for user_id, entry in source.history_entries():
+            target.append_history(user_id, entry)
+            counts["tasks_history"] += 1
+        counts["user_settings"] = 0
+        for user_id, settings in source.all_user_settings():
+            target.set_user_settings(user_id, settings)
+            counts["user_settings"] += 1
+    source.history.close()
+    target.conn.close()
+    return counts
+
+def migrate_json_to_shards(users_dir=USERS_DIR, files=JSON_FILES, history_dir=HISTORY_DIR):
+    """
+    Однократный перенос задач, дней рождения и ивентов из общих JSON-файлов в файлы
+    пользователей (STORAGE_BACKEND=sharded). Исходные файлы не меняются, напоминания
+    и настройки остаются на месте.
+    """
+    if os.path.isdir(users_dir) and os.listdir(users_dir):
+        raise RuntimeError(f"{users_dir}: папка не пуста, миграция уже выполнялась")
+    source = JsonStorage({kind: files[kind] for kind in SHARDED_KINDS}, history_dir)
+    users, catalogs = {}, {}
+    counts = {kind: 0 for kind in SHARDED_KINDS}
+    for kind in SHARDED_KINDS:
+        for user_id, record in source.all_records(kind):
+            users.setdefault(user_id, {k: [] for k in SHARDED_KINDS})[kind].append(record)
+            catalog = catalogs.setdefault(shard_of(user_id), {k: {} for k in SHARDED_KINDS})
+            days = catalog[kind].setdefault(user_id, {})
+            key = catalog_key(kind, record)
+            days[key] = days.get(key, 0) + 1
+            counts[kind] += 1
+    for shard in catalogs:
+        os.makedirs(os.path.join(users_dir, shard), exist_ok=True)
+    for user_id, data in users.items():
+        save_data(user_file(users_dir, user_id), data)
+    for shard, catalog in catalogs.items():
+        save_data(catalog_file(users_dir, shard), catalog)
+    source.history.close()
+    return counts
+
+if __name__ == "__main__":
+    # python storage.py migrate [путь к bot.db]
+    # python storage.py migrate-shards [папка пользователей]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("migrate", "migrate-shards"):
+        print("Использование: python storage.py migrate [bot.db] | migrate-shards [users]")
+        sys.exit(1)
+    if sys.argv[1] == "migrate-shards":
+        counts = migrate_json_to_shards(sys.argv[2] if len(sys.argv) > 2 else USERS_DIR)
+    else:
+        counts = migrate_json_to_sqlite(sys.argv[2] if len(sys.argv) > 2 else SQLITE_PATH)
+    for kind, count in counts.items():
+        print(f"{kind}: {count}")
@@ -0,0 +1,92 @@
+# user_updates.py
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+# ------------------- ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА С ПОРЯДКОМ ПО ПОЛЬЗОВАТЕЛЮ -------------------
+def update_user_key(update):
+    """Чей это апдейт: пользователь, иначе чат; None — порядок не важен"""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Апдейты разных пользователей обрабатываются параллельно (до max_concurrent_updates),
+    апдейты одного пользователя — строго по очереди, в порядке поступления.
+    Так ConversationHandler и данные пользователя видят те же последовательные шаги,
+    что и без concurrent_updates, а медленная отправка одному не задерживает остальных.
+    Очередь на asyncio.Lock честная (FIFO), а задачи PTB создаёт в порядке апдейтов.
+    Слот параллельности берётся только после очереди пользователя: иначе пачка нажатий
+    одного пользователя заняла бы все слоты, ожидая свой Lock, и остановила остальных.
+    Поэтому семафор базового класса не ограничивает (UNBOUNDED), а лимит — свой.
+    """
+
+    UNBOUNDED = 2 ** 30
+    # базовый __init__ строит свой семафор по свойству max_concurrent_updates —
+    # пока он работает, свойство отдаёт UNBOUNDED, затем — настоящий лимит
+    limit = UNBOUNDED
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(self.UNBOUNDED)
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        self.limit = max_concurrent_updates
+        self.slots = asyncio.Semaphore(max_concurrent_updates)
+        self.active = 0
+        # апдейтов внутри do_process_update: ждут своей очереди или слота, либо уже обрабатываются
+        self.queued = 0
+        # user key -> [Lock, сколько апдейтов его ждут]; запись удаляется, когда очередь пуста
+        self.locks = {}
+
+    @property
+    def max_concurrent_updates(self):
+        return self.limit
+
+    @property
+    def current_concurrent_updates(self):
+        return self.active
+
+    @property
+    def waiting_updates(self):
+        """Сколько апдейтов ждут очереди пользователя или слота: update_queue PTB при этом почти пуст"""
+        return self.queued - self.active
+
+    async def _run(self, coroutine):
+        async with self.slots:
+            self.active += 1
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+
+    async def do_process_update(self, update, coroutine):
+        self.queued += 1
+        try:
+            await self._process(update, coroutine)
+        finally:
+            self.queued -= 1
+
+    async def _process(self, update, coroutine):
+        key = update_user_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
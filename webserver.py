@@ -1,14 +1,64 @@
 # webserver.py
 import os
+import hmac
+import json
 from aiohttp import web
 
+# ------------------- НАСТРОЙКИ -------------------
+# Telegram присылает секрет вебхука в этом заголовке (secret_token в setWebhook)
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
 async def handle(request):
     return web.Response(text="OK")
 
 app = web.Application()
 app.add_routes([web.get("/", handle)])
 
+# ------------------- ВЕБХУК TELEGRAM -------------------
+def mount_webhook(web_app, path, secret, feed):
+    """
+    POST path -> feed(dict апдейта). Запросы без правильного секрета отклоняются до разбора JSON.
+    feed только ставит апдейт в очередь, поэтому Telegram получает ответ сразу.
+    """
+
+    async def telegram_webhook(request):
+        # сравниваем байты: строки с не-ASCII символами compare_digest не принимает (TypeError -> 500)
+        received = request.headers.get(SECRET_HEADER, "").encode("utf-8", "surrogateescape")
+        if not hmac.compare_digest(received, secret.encode("utf-8")):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        await feed(data)
+        return web.Response()
+
+    web_app.add_routes([web.post(path, telegram_webhook)])
+
+def mount_health(web_app, check):
+    """GET /healthz: check() -> (ok, подробности); 200 если всё в порядке, иначе 503"""
+
+    async def healthz(request):
+        ok, details = check()
+        return web.json_response(details, status=200 if ok else 503)
+
+    web_app.add_routes([web.get("/healthz", healthz)])
+
+def mount_metrics(web_app, render):
+    """GET /metrics: render() -> метрики в текстовом формате Prometheus"""
+
+    async def metrics(request):
+        return web.Response(body=render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    web_app.add_routes([web.get("/metrics", metrics)])
+
+async def start_site(web_app, port):
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     web.run_app(app, host="0.0.0.0", port=port)
-    
\ No newline at end of file
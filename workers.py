@@ -0,0 +1,95 @@
+# workers.py
+import os
+import zlib
+import asyncio
+import logging
+import aiohttp
+
+# ------------------- НАСТРОЙКИ -------------------
+# Несколько процессов бота делят пользователей по user_id: WORKER_COUNT процессов,
+# у каждого свой WORKER_ID (0..WORKER_COUNT-1) и адрес из WORKER_URLS, по которому
+# остальные пересылают ему апдейты его пользователей. Хранилище — общее (SQLite).
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+WORKER_ID = int(os.getenv("WORKER_ID", "0"))
+WORKER_URLS = [u.strip().rstrip("/") for u in os.getenv("WORKER_URLS", "").split(",") if u.strip()]
+# паузы между повторами пересылки апдейта из polling, с (в сумме ~30 с)
+FORWARD_RETRY_DELAYS = (0.5, 1, 2, 4, 8, 15)
+
+logger = logging.getLogger(__name__)
+
+# ------------------- РАЗБИЕНИЕ ПОЛЬЗОВАТЕЛЕЙ -------------------
+def partition(user_id, count=None):
+    count = count or WORKER_COUNT
+    user_id = str(user_id)
+    if user_id.lstrip("-").isdigit():
+        return int(user_id) % count
+    return zlib.crc32(user_id.encode()) % count
+
+def owns(user_id):
+    """Этот процесс отвечает за пользователя: обрабатывает его апдейты и его задачи JobQueue"""
+    return WORKER_COUNT == 1 or partition(user_id) == WORKER_ID
+
+def worker_file(file_name):
+    """Служебный файл процесса: при нескольких воркерах у каждого свой (кэши, состояние рассылки)"""
+    if WORKER_COUNT == 1:
+        return file_name
+    stem, ext = os.path.splitext(file_name)
+    return f"{stem}.worker{WORKER_ID}{ext}"
+
+def check_config(storage_backend, webhook_secret):
+    """Список проблем конфигурации для WORKER_COUNT > 1 (пустой — всё в порядке)"""
+    problems = []
+    if WORKER_COUNT == 1:
+        return problems
+    if not 0 <= WORKER_ID < WORKER_COUNT:
+        problems.append(f"WORKER_ID={WORKER_ID} вне диапазона 0..{WORKER_COUNT - 1}")
+    if len(WORKER_URLS) != WORKER_COUNT:
+        problems.append(f"WORKER_URLS: нужно {WORKER_COUNT} адресов, задано {len(WORKER_URLS)}")
+    if storage_backend != "sqlite":
+        problems.append("общие данные нескольких воркеров возможны только с STORAGE_BACKEND=sqlite")
+    if not webhook_secret:
+        problems.append("WEBHOOK_SECRET должен быть задан и одинаков у всех воркеров")
+    return problems
+
+# ------------------- ПЕРЕСЫЛКА АПДЕЙТОВ -------------------
+class UpdateForwarder:
+    """
+    POST апдейта на вебхук воркера-владельца с тем же секретом, что у Telegram.
+    Из вебхука доставка надёжна: ошибка пересылки — ошибка ответа Telegram, и он повторит апдейт.
+    Из polling — не более одного раза: getUpdates уже подтвердил апдейт, поэтому forward_retrying()
+    повторяет сам, а если владелец так и не ответил, апдейт теряется (с записью в лог).
+    """
+
+    def __init__(self, path, secret, header="X-Telegram-Bot-Api-Secret-Token"):
+        self.path = path
+        self.secret = secret
+        self.header = header
+        self.session = None
+
+    async def forward(self, data, worker):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        url = WORKER_URLS[worker] + self.path
+        async with self.session.post(url, json=data, headers={self.header: self.secret}) as response:
+            # ошибка уходит наверх: вебхук ответит Telegram 500, и тот повторит доставку
+            response.raise_for_status()
+
+    async def forward_retrying(self, data, worker, delays=FORWARD_RETRY_DELAYS):
+        """forward() с повторами; False — апдейт потерян"""
+        for attempt, delay in enumerate((*delays, None), 1):
+            try:
+                await self.forward(data, worker)
+                return True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if delay is None:
+                    logger.error(
+                        "Апдейт %s потерян: воркер %d не принял его за %d попыток: %s",
+                        data.get("update_id"), worker, attempt, e,
+                    )
+                    return False
+                logger.warning("Апдейт %s: воркер %d недоступен (%s), повтор через %s с", data.get("update_id"), worker, e, delay)
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()